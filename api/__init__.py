@@ -1,15 +1,39 @@
 from flask import Flask
 from sqlalchemy import create_engine
 
+from api.container import Container
+
+from service.authentication.session_token import SessionToken
+from service.authentication.token_generator import TokenGenerator
+from src.user.password_hasher import password_hashing, get_password_hasher
+from src.user.user_repository import session_user_cache
+
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
 db_url = os.getenv("DB_URL")
+# Comma separated, tokens are issued with the first key & verified with any of them.
 authentication_secret_key = os.getenv("AUTHENTICATION_SECRET_KEY")
+authentication_token_format = os.getenv("AUTHENTICATION_TOKEN_FORMAT", "user_id")
+authentication_token_ttl = int(os.getenv("AUTHENTICATION_TOKEN_TTL", 3600))
+session_user_cache_size = int(os.getenv("SESSION_USER_CACHE_SIZE", 1024))
+session_user_cache_ttl = float(os.getenv("SESSION_USER_CACHE_TTL", 300))
+password_hasher = os.getenv("PASSWORD_HASHER", "pbkdf2_sha256")
+password_hash_cost = int(os.getenv("PASSWORD_HASH_COST", 0))
+password_hash_workers = int(os.getenv("PASSWORD_HASH_WORKERS", 4))
+
+session_user_cache.configure(max_size=session_user_cache_size, ttl=session_user_cache_ttl)
+password_hashing.configure(hasher=get_password_hasher(password_hasher, cost=password_hash_cost),
+                           max_workers=password_hash_workers)
+
+token_generator = TokenGenerator(key=authentication_secret_key)
+session_token = SessionToken(token_generator=token_generator, token_format=authentication_token_format,
+                             ttl=authentication_token_ttl)
 
 engine = create_engine(db_url, future=True, echo=True)
-conn = engine.connect()
+
+container = Container(engine=engine)
 
 app = Flask(__name__)
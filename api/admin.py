@@ -1,48 +1,32 @@
-from typing import List
+import json
+import os
 
-from flask import Request, request
+from dotenv import load_dotenv
+from flask import request
+from sqlalchemy.orm import noload
 
-from api import app, engine
+from api import app, engine, container, token_generator
+from api.auth_policy import ADMIN
 from api.base_api import BaseApi
+from api.routes import Route, Schema, register_routes
+from service.authentication.session_token import revoke_user_tokens
+from src.base.unit_of_work import UnitOfWork
 from src.user.user import User
-from src.user.user_repository import get_user_repository
+from src.user.user_repository import session_user_cache
 
 
 class AdminApi(BaseApi):
-    def __init__(self, request: Request, methods: List[str]):
-        super(AdminApi, self).__init__(request=request, methods=methods)
-
-        self.methods_map = {
-            "get_users": self.get_users,
-            "get_user_details": self.get_user_details,
-            "create_user": self.create_user,
-            "update_user": self.update_user,
-            "add_user_role": self.add_user_role,
-        }
-
-    def execute(self, method_name: str, **kwargs):
-        valid, message = self.authorizer.is_admin()
-        if not valid:
-            return self.respond(code=403, message=message)
-        return self.methods_map[method_name](**kwargs)
-
     def get_users(self):
-        user_repository = get_user_repository(engine=engine)
-        users = user_repository.get_all()
-        data = [
-            {
-                "id": it.id,
-                "name": it.name,
-                "deposit": it.deposit,
-                "is_admin": it.is_admin
-            }
-            for it in users
-        ]
-
-        return self.respond(code=200, data=data)
+        user_repository = container.user_repository
+        return self.respond_list(user_repository, to_data=lambda it: {
+            "id": it.id,
+            "name": it.name,
+            "deposit": it.deposit,
+            "is_admin": it.is_admin
+        }, load={"roles": noload})
 
     def get_user_details(self, user_id: str):
-        user_repository = get_user_repository(engine=engine)
+        user_repository = container.user_repository
         user = user_repository.get_by_id(_id=user_id)
         if not user:
             return self.respond(code=404)
@@ -65,24 +49,15 @@ class AdminApi(BaseApi):
     def create_user(self):
         request_json_body_data = self.request.get_json()
 
-        required_parameters = ["user_name", "password"]
-        valid, response = self.validate_parameters(params=required_parameters, request_params=request_json_body_data)
-        if not valid:
-            return response
-
-        user_repository = get_user_repository(engine=engine)
+        user_repository = container.user_repository
         user_name = request_json_body_data["user_name"]
         password = request_json_body_data["password"]
         deposit = request_json_body_data.get("deposit", 0)
         is_admin = request_json_body_data.get("is_admin", False)
 
-        exists_before = user_repository.get_by_user_name(user_name=user_name)
-        if exists_before:
-            return self.respond(code=417, message="User Name {0} exists before.".format(user_name))
-
         user = User(name=user_name, deposit=deposit, is_admin=is_admin)
-        user_repository.insert(user)
-        user_repository.set_user_password(user.id, password)
+        if not user_repository.create_user(user, password=password):
+            return self.respond(code=417, message="User Name {0} exists before.".format(user_name))
 
         data = {
             "user_id": user.id
@@ -90,10 +65,30 @@ class AdminApi(BaseApi):
 
         return self.respond(code=200, data=data)
 
+    def import_users(self):
+        # Accepts {"users": [...]}, a JSON list or a newline delimited JSON body which is streamed row by row.
+        batch_size = self.request.args.get("batch_size", type=int) if "batch_size" in self.request.args else 500
+        if batch_size is None or batch_size < 1:
+            return self.respond(code=417, message="Invalid batch_size, must be at least 1")
+
+        decode = None
+        if self.request.is_json:
+            body = self.request.get_json(silent=True)
+            rows = body.get("users", []) if isinstance(body, dict) else body
+            if not isinstance(rows, list):
+                return self.respond(code=417, message="Invalid request body, a list of users is required")
+        else:
+            rows = (line for line in self.request.stream if line.strip())
+            decode = json.loads
+
+        res = container.user_import.import_users(rows, batch_size=batch_size, decode=decode)
+
+        return self.respond(code=200, data=res.data)
+
     def update_user(self, user_id: str):
         request_json_body_data = self.request.get_json()
 
-        user_repository = get_user_repository(engine=engine)
+        user_repository = container.user_repository
         user = user_repository.get_by_id(_id=user_id)
         if not user:
             return self.respond(code=404)
@@ -105,11 +100,16 @@ class AdminApi(BaseApi):
                     key = "name"
                 setattr(user, key, value)
 
-        user_repository.insert(user)
+        with UnitOfWork(engine):
+            user_repository.insert(user, refresh=False)
+
+            if request_json_body_data.get("password"):
+                password = request_json_body_data["password"]
+                user_repository.set_user_password(user_id=user.id, password=password)
 
-        if request_json_body_data.get("password"):
-            password = request_json_body_data["password"]
-            user_repository.set_user_password(user_id=user.id, password=password)
+        if "is_admin" in request_json_body_data:
+            # Claims tokens carry the admin flag, force the user to sign in again.
+            revoke_user_tokens(user_id=user.id)
 
         data = {
             "id": user.id,
@@ -123,22 +123,18 @@ class AdminApi(BaseApi):
     def add_user_role(self, user_id: str):
         request_json_body_data = self.request.get_json()
 
-        user_repository = get_user_repository(engine=engine)
+        user_repository = container.user_repository
         user = user_repository.get_by_id(_id=user_id)
         if not user:
             return self.respond(code=404)
 
-        required_parameters = ["role"]
-        valid, response = self.validate_parameters(params=required_parameters, request_params=request_json_body_data)
-        if not valid:
-            return response
-
         role = request_json_body_data["role"]
         if role not in ["Seller", "Buyer"]:
             return self.respond(code=417, message="Invalid role {0}, role must be Seller or Buyer".format(role))
 
         user.add_role(role=role)
-        user_repository.insert(user)
+        user_repository.insert(user, refresh=False)
+        revoke_user_tokens(user_id=user.id)
 
         data = {
             "id": user.id,
@@ -153,27 +149,41 @@ class AdminApi(BaseApi):
 
         return self.respond(code=200, data=data)
 
+    def get_session_user_cache_stats(self):
+        return self.respond(code=200, data=session_user_cache.stats())
 
-@app.route("/admin/users", methods=["GET"])
-def get_users():
-    return AdminApi(request=request, methods=["GET"]).execute(method_name="get_users")
-
-
-@app.route("/admin/users/<string:user_id>", methods=["GET"])
-def get_user_details(user_id: str):
-    return AdminApi(request=request, methods=["GET"]).execute(method_name="get_user_details", user_id=user_id)
-
-
-@app.route("/admin/users", methods=["POST"])
-def create_user():
-    return AdminApi(request=request, methods=["POST"]).execute(method_name="create_user")
-
-
-@app.route("/admin/users/<string:user_id>", methods=["PUT"])
-def update_user(user_id: str):
-    return AdminApi(request=request, methods=["PUT"]).execute(method_name="update_user", user_id=user_id)
+    def get_token_keys(self):
+        data = {
+            "key_ids": token_generator.key_ids,
+            "key_usage": token_generator.key_usage
+        }
 
+        return self.respond(code=200, data=data)
 
-@app.route("/admin/users/<string:user_id>/add_role", methods=["POST"])
-def add_user_role(user_id: str):
-    return AdminApi(request=request, methods=["POST"]).execute(method_name="add_user_role", user_id=user_id)
+    def reload_token_keys(self):
+        # Rotates the token keys without a restart, the new key is put first in AUTHENTICATION_SECRET_KEY followed by
+        # the keys which still have valid tokens.
+        load_dotenv(override=True)
+        try:
+            token_generator.set_keys(os.getenv("AUTHENTICATION_SECRET_KEY", ""))
+        except ValueError as e:
+            return self.respond(code=417, message=str(e))
+
+        return self.get_token_keys()
+
+
+register_routes(app, AdminApi(request=request), [
+    Route("/admin/users", ["GET"], "get_users", ADMIN),
+    Route("/admin/users/<string:user_id>", ["GET"], "get_user_details", ADMIN),
+    Route("/admin/users", ["POST"], "create_user", ADMIN,
+          schema=Schema(required={"user_name": str, "password": str}, optional={"deposit": int, "is_admin": bool})),
+    # The body is either JSON or a newline delimited JSON stream, UserImport validates it row by row.
+    Route("/admin/users/import", ["POST"], "import_users", ADMIN),
+    Route("/admin/users/<string:user_id>", ["PUT"], "update_user", ADMIN,
+          schema=Schema(optional={"user_name": str, "password": str, "deposit": int, "is_admin": bool})),
+    Route("/admin/users/<string:user_id>/add_role", ["POST"], "add_user_role", ADMIN,
+          schema=Schema(required={"role": str})),
+    Route("/admin/session_user_cache", ["GET"], "get_session_user_cache_stats", ADMIN),
+    Route("/admin/token_keys", ["GET"], "get_token_keys", ADMIN),
+    Route("/admin/token_keys/reload", ["POST"], "reload_token_keys", ADMIN),
+])
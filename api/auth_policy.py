@@ -0,0 +1,46 @@
+from typing import Tuple
+
+from service.authorize.authorize import Authorize
+from src.user.user import roles_to_mask
+
+
+class AuthPolicy:
+    requires_identity = True
+
+    def check(self, authorizer: Authorize) -> Tuple[bool, str]:
+        raise NotImplementedError
+
+
+class Public(AuthPolicy):
+    requires_identity = False
+
+    def check(self, authorizer: Authorize) -> Tuple[bool, str]:
+        return True, ""
+
+
+class Authenticated(AuthPolicy):
+    def check(self, authorizer: Authorize) -> Tuple[bool, str]:
+        valid, _ = authorizer.get_principal()
+        if not valid:
+            return False, "Not authorized"
+        return True, ""
+
+
+class HasRole(AuthPolicy):
+    def __init__(self, role: str):
+        self.role = role
+        # Compiled once when the endpoints policies are declared, the check is a single bitwise and.
+        self.mask = roles_to_mask([role])
+
+    def check(self, authorizer: Authorize) -> Tuple[bool, str]:
+        return authorizer.has_roles_mask(mask=self.mask, role=self.role)
+
+
+class Admin(AuthPolicy):
+    def check(self, authorizer: Authorize) -> Tuple[bool, str]:
+        return authorizer.is_admin()
+
+
+PUBLIC = Public()
+AUTHENTICATED = Authenticated()
+ADMIN = Admin()
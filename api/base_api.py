@@ -1,8 +1,13 @@
-from typing import List, Optional, Dict, Tuple
+from typing import Optional, Dict, Tuple, Callable
 
-from flask import Request, make_response
+from flask import Request, make_response, g
 
 from service.authorize.authorize import Authorize
+from src.base.domain import Domain
+from src.base.repository import Repository
+from src.user.user import User
+
+MAX_PAGE_LIMIT = 1000
 
 
 class BaseApiResponse:
@@ -23,25 +28,48 @@ class BaseApiResponse:
 
 
 class BaseApi:
-    def __init__(self, request: Request, methods: List[str]):
+    # Built once when the routes are registered & shared by all requests, request is the flask request proxy so any
+    # per request state must be kept on flask.g.
+    def __init__(self, request: Request):
         self.request = request
-        self.methods = methods
-        self.authorizer = Authorize(request)
-        self.is_authorized, self.session_user = self.get_session_user()
 
-    def validate_parameters(self, params: List[str], request_params: Dict) -> Tuple[bool, Optional[BaseApiResponse]]:
-        for it in params:
-            if it not in request_params:
-                message = "Missing parameter, {0} is a required parameter".format(it)
-                return False, self.respond(code=417, message=message)
+    @property
+    def authorizer(self) -> Authorize:
+        # Identity is resolved lazily, public endpoints never build the authorizer nor read the token.
+        if "authorizer" not in g:
+            g.authorizer = Authorize(self.request)
+        return g.authorizer
+
+    @property
+    def is_authorized(self) -> bool:
+        valid, _ = self.get_session_user()
+        return valid
 
-        return True, None
+    @property
+    def session_user(self) -> Optional[User]:
+        _, user = self.get_session_user()
+        return user
 
     def respond(self, code: int = 200, message: str = "", data: Optional[Dict] = None):
         return make_response(BaseApiResponse(code=code, message=message, data=data).to_dict(), code)
 
-    def execute(self, **kwargs) -> BaseApiResponse:
-        pass
+    def respond_list(self, repository: Repository, to_data: Callable[[Domain], Dict],
+                     load: Optional[Dict[str, Callable]] = None):
+        # ?limit=&after= returns a single keyset page, the id to pass as after for the next page is sent in the
+        # X-Next-After header while there may be more records. Without a limit all the records are streamed.
+        if "limit" not in self.request.args:
+            return self.respond(code=200, data=[to_data(it) for it in repository.iter_all(load=load)])
+
+        limit = self.request.args.get("limit", type=int)
+        if limit is None or not 0 < limit <= MAX_PAGE_LIMIT:
+            return self.respond(code=417, message="Invalid limit, must be between 1 and {0}".format(MAX_PAGE_LIMIT))
+
+        page = repository.get_page(limit=limit, after=self.request.args.get("after"), load=load)
+        response = self.respond(code=200, data=[to_data(it) for it in page])
+        if len(page) == limit:
+            response.headers["X-Next-After"] = page[-1].id
+
+        return response
 
-    def get_session_user(self) -> Tuple[bool, Optional["User"]]:
+    def get_session_user(self) -> Tuple[bool, Optional[User]]:
         return self.authorizer.is_authorized()
@@ -0,0 +1,91 @@
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator
+
+from service.authentication.sign_in import SignIn
+from service.authentication.sign_up import SignUp
+from service.user_import import UserImport
+from service.vending_machine import VendingMachineService
+from src.product.product_repository import get_product_repository, ProductRepository
+from src.user.user_repository import get_user_repository, UserRepository
+from src.vending_machine.vending_machine_repository import get_vending_machine_repository, VendingMachineRepository
+
+
+class Container:
+    # Repositories, their mappers & the services are built once at startup and shared by every request & thread, none
+    # of them hold per request state, each call opens its own session.
+    def __init__(self, engine):
+        self.engine = engine
+        self._instances: Dict[str, object] = {}
+        self._overrides: Dict[str, object] = {}
+        # Reentrant, building a service builds the repositories it depends on.
+        self._lock = threading.RLock()
+
+        self.build()
+
+    def build(self) -> None:
+        self.user_repository
+        self.product_repository
+        self.vending_machine_repository
+        self.sign_in
+        self.sign_up
+        self.user_import
+        self.vending_machine_service
+
+    @property
+    def user_repository(self) -> UserRepository:
+        return self._get("user_repository", lambda: get_user_repository(self.engine))
+
+    @property
+    def product_repository(self) -> ProductRepository:
+        return self._get("product_repository", lambda: get_product_repository(self.engine))
+
+    @property
+    def vending_machine_repository(self) -> VendingMachineRepository:
+        return self._get("vending_machine_repository", lambda: get_vending_machine_repository(self.engine))
+
+    @property
+    def sign_in(self) -> SignIn:
+        return self._get("sign_in", lambda: SignIn(user_repository=self.user_repository))
+
+    @property
+    def sign_up(self) -> SignUp:
+        return self._get("sign_up", lambda: SignUp(user_repository=self.user_repository))
+
+    @property
+    def user_import(self) -> UserImport:
+        return self._get("user_import", lambda: UserImport(user_repository=self.user_repository))
+
+    @property
+    def vending_machine_service(self) -> VendingMachineService:
+        return self._get("vending_machine_service", lambda: VendingMachineService(
+            user_repository=self.user_repository, vending_machine_repository=self.vending_machine_repository))
+
+    @contextmanager
+    def override(self, **instances) -> Iterator["Container"]:
+        # Replaces the named instances within the with block, e.g. for tests. Everything else is rebuilt on first use
+        # so the services built on an overridden repository get the override too.
+        previous_overrides = self._overrides
+        with self._lock:
+            self._overrides = {**previous_overrides, **instances}
+            self._instances = {}
+
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._overrides = previous_overrides
+                self._instances = {}
+
+    def _get(self, name: str, build: Callable):
+        if name in self._overrides:
+            return self._overrides[name]
+
+        instance = self._instances.get(name)
+        if instance is None:
+            with self._lock:
+                instance = self._instances.get(name)
+                if instance is None:
+                    instance = self._instances[name] = build()
+
+        return instance
@@ -0,0 +1,90 @@
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+from flask import Flask, request
+
+from api.auth_policy import AuthPolicy
+from api.base_api import BaseApi
+
+FieldType = Union[type, Tuple[type, ...]]
+
+NUMBER = (int, float)
+
+
+class Schema:
+    # JSON object request body, field name to its accepted types. Fields which are not declared are left to the
+    # handler, optional fields may also be null.
+    def __init__(self, required: Optional[Dict[str, FieldType]] = None, optional: Optional[Dict[str, FieldType]] = None):
+        self.required = required or {}
+        self.optional = optional or {}
+
+    def compile(self) -> Callable[[Any], Tuple[bool, str]]:
+        fields = [(key, _as_tuple(types), True) for key, types in self.required.items()] + \
+                 [(key, _as_tuple(types), False) for key, types in self.optional.items()]
+
+        def validate(body: Any) -> Tuple[bool, str]:
+            if not isinstance(body, dict):
+                return False, "Invalid request body, a JSON object is required"
+
+            for key, types, required in fields:
+                value = body.get(key)
+                if value is None:
+                    if required:
+                        return False, "Missing parameter, {0} is a required parameter".format(key)
+                    continue
+
+                # bool is a subclass of int, so it's only accepted where it's declared.
+                if not isinstance(value, types) or (isinstance(value, bool) and bool not in types):
+                    return False, "Invalid parameter, {0} must be of type {1}".format(key, _types_name(types))
+
+            return True, ""
+
+        return validate
+
+
+class Route:
+    def __init__(self, rule: str, methods: List[str], handler: str, auth_policy: AuthPolicy,
+                 schema: Optional[Schema] = None):
+        self.rule = rule
+        self.methods = methods
+        self.handler = handler
+        self.auth_policy = auth_policy
+        self.schema = schema
+
+
+def compile_route(api: BaseApi, route: Route) -> Callable:
+    # Everything which doesn't depend on the request is resolved here once, at startup.
+    handler = getattr(api, route.handler)
+    auth_policy = route.auth_policy
+    validate_body = route.schema.compile() if route.schema else None
+
+    def view(**kwargs):
+        # Malformed bodies are rejected before any token or database work.
+        if validate_body is not None:
+            valid, message = validate_body(request.get_json(silent=True))
+            if not valid:
+                return api.respond(code=417, message=message)
+
+        if auth_policy.requires_identity:
+            valid, message = auth_policy.check(api.authorizer)
+            if not valid:
+                return api.respond(code=403, message=message)
+
+        return handler(**kwargs)
+
+    return view
+
+
+def register_routes(app: Flask, api: BaseApi, routes: List[Route]) -> None:
+    for route in routes:
+        app.add_url_rule(route.rule, endpoint=route.handler, view_func=compile_route(api, route),
+                         methods=route.methods)
+
+
+def _as_tuple(types: FieldType) -> Tuple[type, ...]:
+    return types if isinstance(types, tuple) else (types,)
+
+
+def _types_name(types: Tuple[type, ...]) -> str:
+    names = {str: "string", int: "integer", float: "number", bool: "boolean", list: "list", dict: "object"}
+    # An integer is also a number.
+    return " or ".join(names.get(it, it.__name__) for it in types if not (it is int and float in types))
@@ -1,34 +1,31 @@
-import json
-
 from flask import request
 
-from api import app, engine, authentication_secret_key
+from api import app, container, authentication_token_format, session_token
+from api.auth_policy import PUBLIC
 from api.base_api import BaseApi
-from service.authentication.sign_in import SignIn
-from service.authentication.token_generator import TokenGenerator
-from src.user.user_repository import get_user_repository
+from api.routes import Route, Schema, register_routes
+from service.authentication.session_token import CLAIMS_TOKEN_FORMAT
 
 
 class SingInApi(BaseApi):
-    def execute(self):
+    def sign_in(self):
         request_json_body_data = self.request.get_json()
-        required_parameters = ["user_name", "password"]
-        valid, response = self.validate_parameters(params=required_parameters, request_params=request_json_body_data)
-        if not valid:
-            return response
 
         user_name = request_json_body_data["user_name"]
         password = request_json_body_data["password"]
-        user_repository = get_user_repository(engine)
-        sign_in_service = SignIn(user_repository=user_repository)
-        res = sign_in_service.sign_in(user_name=user_name, password=password)
+        user_repository = container.user_repository
+        res = container.sign_in.sign_in(user_name=user_name, password=password)
 
         data = {}
         if res.success:
             code = 200
-            token_generator = TokenGenerator(key=authentication_secret_key)
-            token_content = json.dumps({"user_id": res.data["user_id"]})
-            token = token_generator.encrypt(token_content)
+            user_id = res.data["user_id"]
+            if authentication_token_format == CLAIMS_TOKEN_FORMAT:
+                user = user_repository.get_by_id(_id=user_id)
+                token = session_token.issue(user_id=user_id, roles=[it.name for it in user.roles],
+                                            is_admin=user.is_admin)
+            else:
+                token = session_token.issue(user_id=user_id)
             data.update({"token": token.data})
         else:
             code = 417
@@ -36,6 +33,6 @@ class SingInApi(BaseApi):
         return self.respond(code=code, message=res.message, data=data)
 
 
-@app.route("/sign_in", methods=["POST"])
-def sign_in():
-    return SingInApi(request=request, methods=["POST"]).execute()
+register_routes(app, SingInApi(request=request), [
+    Route("/sign_in", ["POST"], "sign_in", PUBLIC, schema=Schema(required={"user_name": str, "password": str})),
+])
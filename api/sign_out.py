@@ -0,0 +1,23 @@
+from flask import request
+
+from api import app
+from api.auth_policy import AUTHENTICATED
+from api.base_api import BaseApi
+from api.routes import Route, register_routes
+from service.authentication.session_token import revoke_user_tokens
+
+
+class SignOutApi(BaseApi):
+    def sign_out(self):
+        if not self.authorizer.has_claims_token():
+            return self.respond(code=417, message="Token can't be revoked, only claims tokens can be signed out")
+
+        _, user = self.authorizer.get_principal()
+        revoke_user_tokens(user_id=user.id)
+
+        return self.respond(code=200, message="Signed out successfully")
+
+
+register_routes(app, SignOutApi(request=request), [
+    Route("/sign_out", ["POST"], "sign_out", AUTHENTICATED),
+])
@@ -0,0 +1,76 @@
+from unittest import TestCase
+
+from flask import Flask, request
+from sqlalchemy import create_engine
+from sqlalchemy.pool import StaticPool
+
+from api import container
+from api.admin import AdminApi
+from api.auth_policy import PUBLIC
+from api.routes import Route, register_routes
+from service.user_import import UserImport
+from src import Base
+from src.product.db_product import DbProduct
+from src.user.user_repository import get_user_repository
+
+
+class TestImportUsers(TestCase):
+    def setUp(self):
+        engine = create_engine("sqlite+pysqlite:///:memory:", future=True, connect_args={"check_same_thread": False},
+                               poolclass=StaticPool)
+        Base.metadata.create_all(engine)
+        self.user_repository = get_user_repository(engine)
+
+        app = Flask(__name__)
+        register_routes(app, AdminApi(request=request), [
+            Route("/admin/users/import", ["POST"], "import_users", PUBLIC),
+        ])
+        self.client = app.test_client()
+
+        override = container.override(user_import=UserImport(user_repository=self.user_repository))
+        override.__enter__()
+        self.addCleanup(override.__exit__, None, None, None)
+
+    def test_json_body(self):
+        response = self.client.post("/admin/users/import", json=[
+            {"user_name": "user-1", "password": "1234"},
+            [1],
+            "user-2",
+        ])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()["data"]["imported"], 1)
+        self.assertEqual([it["row"] for it in response.get_json()["data"]["invalid"]], [1, 2])
+
+        response = self.client.post("/admin/users/import", json={"users": [{"user_name": "user-3", "password": "1"}]})
+        self.assertEqual(response.get_json()["data"]["imported"], 1)
+
+        for body in [{"users": "ab"}, "ab", 1]:
+            response = self.client.post("/admin/users/import", json=body)
+            self.assertEqual(response.status_code, 417)
+
+    def test_invalid_batch_size(self):
+        for batch_size in ["-1", "0", "a", ""]:
+            response = self.client.post("/admin/users/import?batch_size={0}".format(batch_size),
+                                        json=[{"user_name": "user-1", "password": "1234"}])
+            self.assertEqual(response.status_code, 417)
+
+        response = self.client.post("/admin/users/import?batch_size=1",
+                                    json=[{"user_name": "user-1", "password": "1234"}])
+        self.assertEqual(response.get_json()["data"]["imported"], 1)
+
+    def test_newline_delimited_json_body(self):
+        body = "\n".join([
+            '{"user_name": "user-1", "password": "1234"}',
+            '{"user_name": ',
+            '[1]',
+            '{"user_name": "user-2", "password": "1234", "deposit": 10}',
+        ])
+        response = self.client.post("/admin/users/import", data=body, content_type="application/x-ndjson")
+
+        self.assertEqual(response.status_code, 200)
+        data = response.get_json()["data"]
+        self.assertEqual(data["imported"], 2)
+        self.assertEqual([it["row"] for it in data["invalid"]], [1, 2])
+        self.assertTrue(data["invalid"][0]["message"].startswith("Invalid JSON"))
+        self.assertEqual(data["invalid"][1]["message"], "Invalid row, a JSON object is required")
+        self.assertEqual(self.user_repository.get_by_user_name("user-2").deposit, 10)
@@ -0,0 +1,36 @@
+from concurrent.futures import ThreadPoolExecutor
+from unittest import TestCase
+
+from sqlalchemy import create_engine
+
+from api.container import Container
+from src.user.user_repository import get_user_repository
+
+
+class TestContainer(TestCase):
+    def setUp(self):
+        self.engine = create_engine("sqlite+pysqlite:///:memory:", future=True)
+        self.container = Container(engine=self.engine)
+
+    def test_instances_are_shared(self):
+        self.assertIs(self.container.user_repository, self.container.user_repository)
+        self.assertIs(self.container.sign_in.user_repository, self.container.user_repository)
+        self.assertIs(self.container.vending_machine_service.vending_machine_repository,
+                      self.container.vending_machine_repository)
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            repositories = list(executor.map(lambda _: self.container.product_repository, range(32)))
+        self.assertTrue(all(it is self.container.product_repository for it in repositories))
+
+    def test_override(self):
+        user_repository = self.container.user_repository
+        sign_up = self.container.sign_up
+        other_user_repository = get_user_repository(self.engine)
+
+        with self.container.override(user_repository=other_user_repository):
+            self.assertIs(self.container.user_repository, other_user_repository)
+            self.assertIs(self.container.sign_up.user_repository, other_user_repository)
+
+        self.assertIsNot(self.container.user_repository, other_user_repository)
+        self.assertIsNot(self.container.sign_up, sign_up)
+        self.assertIsNot(user_repository, other_user_repository)
@@ -0,0 +1,81 @@
+from typing import Tuple
+from unittest import TestCase
+
+from flask import Flask, request
+
+from api.auth_policy import AuthPolicy, PUBLIC
+from api.base_api import BaseApi
+from api.routes import Route, Schema, NUMBER, register_routes
+
+
+class CountingPolicy(AuthPolicy):
+    def __init__(self):
+        self.checks = 0
+
+    def check(self, authorizer) -> Tuple[bool, str]:
+        self.checks += 1
+        return True, ""
+
+
+class ItemsApi(BaseApi):
+    def create_item(self):
+        return self.respond(code=200, data=self.request.get_json())
+
+    def get_item(self, item_id: str):
+        return self.respond(code=200, data={"id": item_id})
+
+
+class TestSchema(TestCase):
+    def setUp(self):
+        self.validate = Schema(required={"name": str, "qty": int}, optional={"cost": NUMBER}).compile()
+
+    def test_valid_body(self):
+        self.assertEqual(self.validate({"name": "Cola", "qty": 2, "cost": 5.5, "other": []}), (True, ""))
+        self.assertEqual(self.validate({"name": "Cola", "qty": 2, "cost": None}), (True, ""))
+
+    def test_missing_parameter(self):
+        valid, message = self.validate({"name": "Cola"})
+
+        self.assertFalse(valid)
+        self.assertEqual(message, "Missing parameter, qty is a required parameter")
+
+    def test_invalid_parameter_type(self):
+        self.assertFalse(self.validate({"name": "Cola", "qty": "2"})[0])
+        self.assertFalse(self.validate({"name": "Cola", "qty": True})[0])
+
+        valid, message = self.validate({"name": "Cola", "qty": 2, "cost": "5"})
+        self.assertFalse(valid)
+        self.assertEqual(message, "Invalid parameter, cost must be of type number")
+
+    def test_body_must_be_an_object(self):
+        self.assertFalse(self.validate(None)[0])
+        self.assertFalse(self.validate([{"name": "Cola", "qty": 2}])[0])
+
+
+class TestRoutes(TestCase):
+    def setUp(self):
+        self.policy = CountingPolicy()
+        app = Flask(__name__)
+        register_routes(app, ItemsApi(request=request), [
+            Route("/items", ["POST"], "create_item", self.policy, schema=Schema(required={"name": str})),
+            Route("/items/<string:item_id>", ["GET"], "get_item", PUBLIC),
+        ])
+        self.client = app.test_client()
+
+    def test_malformed_body_is_rejected_before_the_auth_policy(self):
+        response = self.client.post("/items", json={"qty": 1})
+        self.assertEqual(response.status_code, 417)
+
+        response = self.client.post("/items", data="name=Cola")
+        self.assertEqual(response.status_code, 417)
+
+        self.assertEqual(self.policy.checks, 0)
+
+    def test_dispatch(self):
+        response = self.client.post("/items", json={"name": "Cola"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()["data"], {"name": "Cola"})
+        self.assertEqual(self.policy.checks, 1)
+
+        response = self.client.get("/items/item-1")
+        self.assertEqual(response.get_json()["data"], {"id": "item-1"})
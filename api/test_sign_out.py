@@ -0,0 +1,55 @@
+from unittest import TestCase
+
+from flask import Flask, request
+from sqlalchemy import create_engine
+from sqlalchemy.pool import StaticPool
+
+from api import container, token_generator
+from api.auth_policy import AUTHENTICATED
+from api.routes import Route, register_routes
+from api.sign_out import SignOutApi
+from service.authentication.session_token import SessionToken, CLAIMS_TOKEN_FORMAT, USER_ID_TOKEN_FORMAT
+from src import Base
+from src.user.user import User, Role
+from src.user.user_repository import get_user_repository, session_user_cache
+
+
+class TestSignOut(TestCase):
+    def setUp(self):
+        engine = create_engine("sqlite+pysqlite:///:memory:", future=True, connect_args={"check_same_thread": False},
+                               poolclass=StaticPool)
+        Base.metadata.create_all(engine)
+        self.user_repository = get_user_repository(engine)
+        self.user = User(name="test@test.com", roles=[Role(name="Buyer")])
+        self.user_repository.insert(self.user)
+        session_user_cache.clear()
+
+        app = Flask(__name__)
+        register_routes(app, SignOutApi(request=request), [
+            Route("/sign_out", ["POST"], "sign_out", AUTHENTICATED),
+        ])
+        self.client = app.test_client()
+
+        override = container.override(user_repository=self.user_repository)
+        override.__enter__()
+        self.addCleanup(override.__exit__, None, None, None)
+
+    def test_claims_token(self):
+        token = self._issue(CLAIMS_TOKEN_FORMAT)
+
+        response = self.client.post("/sign_out", headers={"token": token})
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.post("/sign_out", headers={"token": token})
+        self.assertEqual(response.status_code, 403)
+
+    def test_user_id_token_can_not_be_revoked(self):
+        token = self._issue(USER_ID_TOKEN_FORMAT)
+
+        response = self.client.post("/sign_out", headers={"token": token})
+        self.assertEqual(response.status_code, 417)
+        self.assertEqual(response.get_json()["message"], "Token can't be revoked, only claims tokens can be signed out")
+
+    def _issue(self, token_format: str) -> str:
+        session_token = SessionToken(token_generator=token_generator, token_format=token_format)
+        return session_token.issue(user_id=self.user.id, roles=["Buyer"]).data
@@ -1,20 +1,19 @@
-from typing import Optional, List, Dict
+from typing import Optional, Dict
 
-from flask import jsonify, request, Request
+from flask import request
+from sqlalchemy.orm import noload
 
-from api import app, engine
+from api import app, container
+from api.auth_policy import PUBLIC, AUTHENTICATED, ADMIN, HasRole
 from api.base_api import BaseApi
-from service.authorize.authorize import Authorize
-from service.vending_machine import VendingMachineService
+from api.routes import Route, Schema, register_routes
+from src.base.unit_of_work import UnitOfWork
 from src.user.user import User
-from src.user.user_repository import get_user_repository
 from src.vending_machine.vending_machine import VendingMachine, VendingMachineInventory
-from src.vending_machine.vending_machine_repository import get_vending_machine_repository
 
 
 def has_update_inventory_permission(user: User, inventory_line: VendingMachineInventory):
-    valid: bool = any(it.name == "Seller" for it in user.roles)
-    if not valid:
+    if not user.has_role("Seller"):
         return False, "Must have Seller permission to complete this action"
 
     if user.id != inventory_line.seller_id:
@@ -24,39 +23,17 @@ def has_update_inventory_permission(user: User, inventory_line: VendingMachineIn
 
 
 class VendingMachinesApi(BaseApi):
-    def __init__(self, request: Request, methods: List[str]):
-        super(VendingMachinesApi, self).__init__(request=request, methods=methods)
-
-        self.methods_map = {
-            "get_vending_machines": self.get_vending_machines,
-            "get_vending_machine_details": self.get_vending_machine_details,
-            "create_vending_machine": self.create_vending_machine,
-            "update_vending_machine": self.update_vending_machine,
-            "update_vending_machine_inventory": self.update_vending_machine_inventory,
-            "add_user_deposit": self.add_user_deposit,
-            "buy_product": self.buy_product
-        }
-
-    def execute(self, method_name: str, **kwargs):
-        return self.methods_map[method_name](**kwargs)
-
     def get_vending_machines(self):
-        vending_machine_repository = get_vending_machine_repository(engine=engine)
-        vending_machines = vending_machine_repository.get_all()
-        data = [
-            {
-                "id": it.id,
-                "name": it.name,
-                "model_number": it.model_number,
-                "location": it.location
-            }
-            for it in vending_machines
-        ]
-
-        return self.respond(code=200, data=data)
+        vending_machine_repository = container.vending_machine_repository
+        return self.respond_list(vending_machine_repository, to_data=lambda it: {
+            "id": it.id,
+            "name": it.name,
+            "model_number": it.model_number,
+            "location": it.location
+        }, load={"inventory": noload})
 
     def get_vending_machine_details(self, vending_machine_id: str):
-        vending_machine_repository = get_vending_machine_repository(engine=engine)
+        vending_machine_repository = container.vending_machine_repository
         vending_machine = vending_machine_repository.get_by_id(_id=vending_machine_id)
         if not vending_machine:
             return self.respond(code=404)
@@ -80,24 +57,15 @@ class VendingMachinesApi(BaseApi):
         return self.respond(code=200, data=data)
 
     def create_vending_machine(self):
-        valid, message = self.authorizer.is_admin()
-        if not valid:
-            return self.respond(code=403, message=message)
-
         request_json_body_data = self.request.get_json()
 
-        required_parameters = ["name", "model_number", "location"]
-        valid, response = self.validate_parameters(params=required_parameters, request_params=request_json_body_data)
-        if not valid:
-            return response
-
-        vending_machine_repository = get_vending_machine_repository(engine=engine)
+        vending_machine_repository = container.vending_machine_repository
         name = request_json_body_data["name"]
         model_number = request_json_body_data["model_number"]
         location = request_json_body_data["location"]
 
         vending_machine = VendingMachine(name=name, model_number=model_number, location=location)
-        vending_machine_repository.insert(vending_machine)
+        vending_machine_repository.insert(vending_machine, refresh=False)
 
         data = {
             "vending_machine": vending_machine.id
@@ -106,13 +74,9 @@ class VendingMachinesApi(BaseApi):
         return self.respond(code=200, data=data)
 
     def update_vending_machine(self, vending_machine_id: str):
-        valid, message = self.authorizer.is_admin()
-        if not valid:
-            return self.respond(code=403, message=message)
-
         json_body_data = self.request.get_json()
 
-        vending_machine_repository = get_vending_machine_repository(engine=engine)
+        vending_machine_repository = container.vending_machine_repository
         vending_machine = vending_machine_repository.get_by_id(_id=vending_machine_id)
         if not vending_machine:
             return self.respond(code=404)
@@ -122,7 +86,7 @@ class VendingMachinesApi(BaseApi):
             if key in vending_machine_attrs:
                 setattr(vending_machine, key, value)
 
-        vending_machine_repository.insert(vending_machine)
+        vending_machine_repository.insert(vending_machine, refresh=False)
 
         data = {
             "id": vending_machine.id,
@@ -134,33 +98,28 @@ class VendingMachinesApi(BaseApi):
         return self.respond(code=200, data=data)
 
     def update_vending_machine_inventory(self, vending_machine_id: str):
-        valid, message = self.authorizer.has_role(role="Seller")
-        if not valid:
-            return self.respond(code=403, message=message)
-
         json_body_data = self.request.get_json()
 
-        required_parameters = ["product_id"]
-        valid, response = self.validate_parameters(params=required_parameters, request_params=json_body_data)
-        if not valid:
-            return response
+        product_id = json_body_data["product_id"]
 
-        vending_machine_repository = get_vending_machine_repository(engine=engine)
-        vending_machine = vending_machine_repository.get_by_id(_id=vending_machine_id)
+        vending_machine_repository = container.vending_machine_repository
+        vending_machine = vending_machine_repository.get_by_id_with_inventory(_id=vending_machine_id,
+                                                                              product_ids=[product_id])
         if not vending_machine:
             return self.respond(code=404, message="Vending machine {0} not found".format(vending_machine_id))
 
-        product_id = json_body_data["product_id"]
         cost = json_body_data.get("cost", None)
         qty = json_body_data.get("qty", None)
 
         inventory_line: Optional[VendingMachineInventory] = vending_machine.get_product_inventory_line(product_id)
+        added_qty = None
 
         if not inventory_line:
             qty = qty or 0
             cost = cost or 0
+            _, seller = self.authorizer.get_principal()
             inventory_line = VendingMachineInventory(vending_machine_id=vending_machine.id, product_id=product_id,
-                                                     seller_id=self.session_user.id, amount_available=qty, cost=cost)
+                                                     seller_id=seller.id, amount_available=qty, cost=cost)
             vending_machine.create_inventory_line(inventory_line)
 
         else:
@@ -169,36 +128,28 @@ class VendingMachinesApi(BaseApi):
             if not valid:
                 return self.respond(code=403, message=message)
 
-            if qty is not None:
-                inventory_line.amount_available += qty
+            # The stock is added by the database, a sale committed since the line was loaded isn't overwritten.
+            added_qty = qty
 
             if cost is not None:
                 inventory_line.cost = cost
 
-        vending_machine_repository.insert(vending_machine)
+        with UnitOfWork(vending_machine_repository.engine):
+            if added_qty is not None and not vending_machine_repository.add_stock(inventory_line_id=inventory_line.id,
+                                                                                  qty=added_qty):
+                return self.respond(code=417,
+                                    message="Qty {0} would take the available amount below zero".format(added_qty))
+
+            vending_machine_repository.insert(vending_machine, refresh=False)
 
         return self.respond(code=200, message="Updated successfully")
 
     def add_user_deposit(self):
-        valid, user = self.authorizer.is_authorized()
-        if not valid:
-            return self.respond(code=403)
-
         request_json_body_data = self.request.get_json()
 
-        required_parameters = ["deposit"]
-        valid, response = self.validate_parameters(params=required_parameters, request_params=request_json_body_data)
-        if not valid:
-            return response
-
-        user_repository = get_user_repository(engine)
-        vending_machine_repository = get_vending_machine_repository(engine)
         deposit = request_json_body_data["deposit"]
 
-        vending_machine_service = VendingMachineService(user_repository=user_repository,
-                                                        vending_machine_repository=vending_machine_repository)
-
-        res = vending_machine_service.add_user_deposit(user=user, deposit=deposit)
+        res = container.vending_machine_service.add_user_deposit(user=self.session_user, deposit=deposit)
         if not res.success:
             return self.respond(code=417, message=res.message)
 
@@ -211,34 +162,19 @@ class VendingMachinesApi(BaseApi):
         return self.respond(code=200, data=data)
 
     def buy_product(self, vending_machine_id: str):
-        valid, user = self.authorizer.is_authorized()
-        if not valid:
-            return self.respond(code=403)
+        vending_machine_repository = container.vending_machine_repository
 
-        valid, message = self.authorizer.has_role(role="Buyer")
-        if not valid:
-            return self.respond(code=403, message=message)
-
-        vending_machine_repository = get_vending_machine_repository(engine=engine)
-        user_repository = get_user_repository(engine=engine)
+        request_json_body_data = self.request.get_json()
+        product_id = request_json_body_data["product_id"]
 
-        vending_machine = vending_machine_repository.get_by_id(_id=vending_machine_id)
+        vending_machine = vending_machine_repository.get_by_id_with_inventory(_id=vending_machine_id,
+                                                                              product_ids=[product_id])
         if not vending_machine:
             return self.respond(code=404)
 
-        request_json_body_data = self.request.get_json()
-        required_parameters = ["product_id", "qty"]
-        valid, response = self.validate_parameters(params=required_parameters, request_params=request_json_body_data)
-        if not valid:
-            return response
-
-        vending_machine_service = VendingMachineService(user_repository=user_repository,
-                                                        vending_machine_repository=vending_machine_repository)
-
-        product_id = request_json_body_data["product_id"]
         qty = request_json_body_data["qty"]
-        res = vending_machine_service.buy_product(user=user, vending_machine=vending_machine, product_id=product_id,
-                                                  qty=qty)
+        res = container.vending_machine_service.buy_product(user=self.session_user, vending_machine=vending_machine,
+                                                  product_id=product_id, qty=qty)
 
         if not res.success:
             return self.respond(code=417, message=res.message)
@@ -251,40 +187,18 @@ class VendingMachinesApi(BaseApi):
         return self.respond(code=200, data=data)
 
 
-@app.route("/vending_machines", methods=["GET"])
-def get_vending_machines():
-    return VendingMachinesApi(request=request, methods=["GET"]).execute(method_name="get_vending_machines")
-
-
-@app.route("/vending_machines/<string:vending_machine_id>", methods=["GET"])
-def get_vending_machine_details(vending_machine_id: str):
-    return VendingMachinesApi(request=request, methods=["GET"]).execute(method_name="get_vending_machine_details",
-                                                                        vending_machine_id=vending_machine_id)
-
-
-@app.route("/vending_machines", methods=["POST"])
-def create_vending_machine():
-    return VendingMachinesApi(request=request, methods=["POST"]).execute(method_name="create_vending_machine")
-
-
-@app.route("/vending_machines/<string:vending_machine_id>", methods=["PUT"])
-def update_vending_machine(vending_machine_id: str):
-    return VendingMachinesApi(request=request, methods=["PUT"]).execute(method_name="update_vending_machine",
-                                                                        vending_machine_id=vending_machine_id)
-
-
-@app.route("/vending_machines/<string:vending_machine_id>/update_inventory", methods=["POST"])
-def update_vending_machine_inventory(vending_machine_id: str):
-    return VendingMachinesApi(request=request, methods=["POST"]).execute(method_name="update_vending_machine_inventory",
-                                                                         vending_machine_id=vending_machine_id)
-
-
-@app.route("/vending_machines/add_user_deposit", methods=["POST"])
-def add_user_deposit():
-    return VendingMachinesApi(request=request, methods=["POST"]).execute(method_name="add_user_deposit")
-
-
-@app.route("/vending_machines/<string:vending_machine_id>/buy", methods=["POST"])
-def buy_product(vending_machine_id: str):
-    return VendingMachinesApi(request=request, methods=["POST"]).execute(method_name="buy_product",
-                                                                         vending_machine_id=vending_machine_id)
+register_routes(app, VendingMachinesApi(request=request), [
+    Route("/vending_machines", ["GET"], "get_vending_machines", PUBLIC),
+    Route("/vending_machines/<string:vending_machine_id>", ["GET"], "get_vending_machine_details", PUBLIC),
+    Route("/vending_machines", ["POST"], "create_vending_machine", ADMIN,
+          schema=Schema(required={"name": str, "model_number": str, "location": str})),
+    Route("/vending_machines/<string:vending_machine_id>", ["PUT"], "update_vending_machine", ADMIN,
+          schema=Schema(optional={"name": str, "model_number": str, "location": str})),
+    Route("/vending_machines/<string:vending_machine_id>/update_inventory", ["POST"],
+          "update_vending_machine_inventory", HasRole("Seller"),
+          schema=Schema(required={"product_id": str}, optional={"qty": int, "cost": int})),
+    Route("/vending_machines/add_user_deposit", ["POST"], "add_user_deposit", AUTHENTICATED,
+          schema=Schema(required={"deposit": int})),
+    Route("/vending_machines/<string:vending_machine_id>/buy", ["POST"], "buy_product", HasRole("Buyer"),
+          schema=Schema(required={"product_id": str, "qty": int})),
+])
@@ -0,0 +1,70 @@
+# Memory & attribute access of large inventory & user lists, the slotted domain classes against plain dataclasses with
+# the same fields & tracking state, run from the project root:
+#   python -m benchmarks.domain_objects
+import time
+import tracemalloc
+from dataclasses import make_dataclass, field, fields
+
+from src.base.domain import Domain
+from src.user.user import User
+from src.vending_machine.vending_machine import VendingMachineInventory
+
+OBJECTS_COUNT = 100000
+
+
+def plain_dataclass(domain_class):
+    def __post_init__(self):
+        Domain.__post_init__(self)
+        for key in domain_class.get_list_of_map():
+            setattr(self, key, getattr(self, key) or [])
+
+    return make_dataclass("Plain{0}".format(domain_class.__name__),
+                          [(it.name, it.type, field(default=it.default)) for it in fields(domain_class)],
+                          namespace={"__post_init__": __post_init__})
+
+
+def measure_memory(build) -> float:
+    tracemalloc.start()
+    objects = build()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del objects
+    return size / OBJECTS_COUNT
+
+
+def measure_access(objects, key: str, repeat: int = 5) -> float:
+    # Best of repeat passes, reading & writing the attribute of every object.
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for it in objects:
+            setattr(it, key, getattr(it, key) + 1)
+        timings.append(time.perf_counter() - start)
+    return min(timings) / len(objects) * 1000000000
+
+
+def main():
+    def build_inventory(domain_class):
+        return [domain_class(id=str(it), vending_machine_id="vending-machine", product_id="product-{0}".format(it),
+                             seller_id="seller", amount_available=10, cost=5) for it in range(OBJECTS_COUNT)]
+
+    def build_users(domain_class):
+        return [domain_class(id=str(it), name="user-{0}".format(it), deposit=0, roles_mask=1)
+                for it in range(OBJECTS_COUNT)]
+
+    results = []
+    for name, domain_class, build, key in [
+        ("VendingMachineInventory", VendingMachineInventory, build_inventory, "amount_available"),
+        ("User", User, build_users, "deposit"),
+    ]:
+        for kind, cls in [("plain", plain_dataclass(domain_class)), ("slotted", domain_class)]:
+            results.append(("{0}, {1}".format(name, kind), measure_memory(lambda: build(cls)),
+                            measure_access(build(cls), key)))
+
+    print("{0:<35} {1:>14} {2:>18}".format("domain objects", "bytes/object", "ns/read & write"))
+    for name, memory, access in results:
+        print("{0:<35} {1:>14.0f} {2:>18.1f}".format(name, memory, access))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+# Mapping 100k inventory lines in both directions, compiling the mapping plans for every row against the cached plans,
+# run from the project root:
+#   python -m benchmarks.mapper
+import time
+
+from src.vending_machine.db_vending_machine import DbVendingMachine
+from src.vending_machine.db_vending_machine_inventory import DbVendingMachineInventory
+from src.vending_machine.mapper import VendingMachineMapper
+from src.vending_machine.vending_machine import VendingMachine, VendingMachineInventory
+
+ROWS_COUNT = 100000
+
+
+def measure(func, items) -> float:
+    start = time.perf_counter()
+    for it in items:
+        func(it)
+    return time.perf_counter() - start
+
+
+def main():
+    mapper = VendingMachineMapper(mapped_entities=[
+        (VendingMachine, DbVendingMachine),
+        (VendingMachineInventory, DbVendingMachineInventory)
+    ])
+
+    rows = [
+        {"id": str(it), "vending_machine_id": "vending-machine", "product_id": "product-{0}".format(it % 50),
+         "seller_id": "seller", "amount_available": 10, "cost": 5}
+        for it in range(ROWS_COUNT)
+    ]
+    inventory = [mapper.data_to_domain(it, VendingMachineInventory) for it in rows]
+
+    def uncached_data_to_domain(row):
+        mapper._domain_plans.clear()
+        mapper.data_to_domain(row, VendingMachineInventory)
+
+    def uncached_domain_to_data(domain):
+        mapper._data_plans.clear()
+        mapper.domain_to_data(domain, DbVendingMachineInventory)
+
+    results = [
+        ("data_to_domain, plan compiled per row", measure(uncached_data_to_domain, rows)),
+        ("data_to_domain, cached plan", measure(lambda it: mapper.data_to_domain(it, VendingMachineInventory), rows)),
+        ("domain_to_data, plan compiled per row", measure(uncached_domain_to_data, inventory)),
+        ("domain_to_data, cached plan",
+         measure(lambda it: mapper.domain_to_data(it, DbVendingMachineInventory), inventory)),
+    ]
+
+    print("{0:<40} {1:>10} {2:>12}".format("mapping", "seconds", "rows/s"))
+    for name, seconds in results:
+        print("{0:<40} {1:>10.2f} {2:>12.0f}".format(name, seconds, ROWS_COUNT / seconds))
+
+
+if __name__ == "__main__":
+    main()
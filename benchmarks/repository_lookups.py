@@ -0,0 +1,82 @@
+# Per call overhead of the hot repository lookups, building the select on every call against the cached statements,
+# run from the project root:
+#   python -m benchmarks.repository_lookups
+import time
+
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+from src import Base
+from src.base.repository import _statements_cache
+from src.product.db_product import DbProduct
+from src.user.db_user import DbUser
+from src.user.user import User, Role
+from src.user.user_repository import get_user_repository
+from src.vending_machine.vending_machine import VendingMachine, VendingMachineInventory
+from src.vending_machine.vending_machine_repository import get_vending_machine_repository
+
+CALLS_COUNT = 5000
+
+
+def measure(func) -> float:
+    start = time.perf_counter()
+    for _ in range(CALLS_COUNT):
+        func()
+    return (time.perf_counter() - start) / CALLS_COUNT * 1000000
+
+
+def main():
+    engine = create_engine("sqlite+pysqlite:///:memory:", future=True, connect_args={"check_same_thread": False},
+                           poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+
+    user_repository = get_user_repository(engine)
+    vending_machine_repository = get_vending_machine_repository(engine)
+
+    user = User(name="user", roles=[Role(name="Buyer")])
+    user_repository.insert(user)
+    vending_machine = VendingMachine(name="Vending Machine", model_number="1", location="Cairo", inventory=[
+        VendingMachineInventory(product_id="product-{0}".format(it), seller_id=user.id, amount_available=10, cost=5)
+        for it in range(50)
+    ])
+    vending_machine_repository.insert(vending_machine)
+
+    # Fills the statements cache.
+    user_repository.get_credentials_by_user_name("user")
+    credentials_stmt = _statements_cache[user_repository._statement_key("get_credentials_by_user_name")]
+
+    session = Session(engine)
+
+    def build_by_id():
+        session.scalars(select(DbUser).where(DbUser.id == user.id)).one()
+
+    def build_by_user_name():
+        session.execute(select(DbUser.id, DbUser.password).where(DbUser.name == "user")).one()
+
+    def cached_by_id():
+        user_repository._get_by_id(session=session, _id=user.id)
+
+    def cached_by_user_name():
+        session.execute(credentials_stmt, {"name": "user"}).one()
+
+    results = [
+        ("statement by id, built per call", measure(build_by_id)),
+        ("statement by id, cached", measure(cached_by_id)),
+        ("credentials by user name, built per call", measure(build_by_user_name)),
+        ("credentials by user name, cached", measure(cached_by_user_name)),
+        ("UserRepository.get_by_id", measure(lambda: user_repository.get_by_id(user.id))),
+        ("UserRepository.get_by_user_name", measure(lambda: user_repository.get_by_user_name("user"))),
+        ("get_by_id_with_inventory, 1 of 50 lines", measure(
+            lambda: vending_machine_repository.get_by_id_with_inventory(vending_machine.id, ["product-7"]))),
+        ("get_by_id, 50 lines", measure(lambda: vending_machine_repository.get_by_id(vending_machine.id))),
+    ]
+    session.close()
+
+    print("{0:<45} {1:>12}".format("lookup", "us/call"))
+    for name, per_call in results:
+        print("{0:<45} {1:>12.1f}".format(name, per_call))
+
+
+if __name__ == "__main__":
+    main()
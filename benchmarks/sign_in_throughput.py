@@ -0,0 +1,66 @@
+# Sign in throughput for each password hasher & cost, run from the project root:
+#   python -m benchmarks.sign_in_throughput
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import create_engine
+from sqlalchemy.pool import StaticPool
+
+from service.authentication.sign_in import SignIn
+from src import Base
+from src.user.db_role import DbRole
+from src.user.db_user import DbUser
+from src.user.password_hasher import password_hashing, Sha256PasswordHasher, Pbkdf2PasswordHasher, \
+    ScryptPasswordHasher
+from src.user.user import User
+from src.user.user_repository import get_user_repository
+
+USERS_COUNT = 10
+SIGN_INS_COUNT = 50
+SERVING_THREADS = 8
+
+HASHERS = [
+    Sha256PasswordHasher(),
+    Pbkdf2PasswordHasher(iterations=100000),
+    Pbkdf2PasswordHasher(iterations=260000),
+    Pbkdf2PasswordHasher(iterations=600000),
+    ScryptPasswordHasher(n=2 ** 14),
+    ScryptPasswordHasher(n=2 ** 15),
+]
+
+
+def run(hasher, workers: int) -> float:
+    engine = create_engine("sqlite+pysqlite:///:memory:", future=True, connect_args={"check_same_thread": False},
+                           poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+
+    password_hashing.configure(hasher=hasher, max_workers=workers)
+    user_repository = get_user_repository(engine)
+    for it in range(USERS_COUNT):
+        user = User(name="user{0}".format(it))
+        user_repository.insert(user)
+        user_repository.set_user_password(user_id=user.id, password="password{0}".format(it))
+
+    sign_in_service = SignIn(user_repository=user_repository)
+
+    def sign_in(it: int):
+        user_index = it % USERS_COUNT
+        res = sign_in_service.sign_in(user_name="user{0}".format(user_index), password="password{0}".format(user_index))
+        assert res.success
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=SERVING_THREADS) as executor:
+        list(executor.map(sign_in, range(SIGN_INS_COUNT)))
+    return SIGN_INS_COUNT / (time.perf_counter() - start)
+
+
+def main():
+    print("{0:<40} {1:>8} {2:>14}".format("hasher", "workers", "sign_ins/sec"))
+    for hasher in HASHERS:
+        for workers in [1, 4]:
+            throughput = run(hasher=hasher, workers=workers)
+            print("{0:<40} {1:>8} {2:>14.1f}".format(hasher.encode_prefix() or hasher.algorithm, workers, throughput))
+
+
+if __name__ == "__main__":
+    main()
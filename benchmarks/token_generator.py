@@ -0,0 +1,52 @@
+# Token encrypt & verify throughput, building a TokenGenerator per call against a shared key ring, run from the
+# project root:
+#   python -m benchmarks.token_generator
+import time
+
+from cryptography.fernet import Fernet
+
+from service.authentication.token_generator import TokenGenerator
+
+CALLS_COUNT = 5000
+
+PRIMARY_KEY = Fernet.generate_key().decode()
+SECONDARY_KEY = Fernet.generate_key().decode()
+KEYS = "{0},{1}".format(PRIMARY_KEY, SECONDARY_KEY)
+
+
+def per_call_encrypt():
+    TokenGenerator(key=KEYS).encrypt("{\"user_id\": \"user-1\"}")
+
+
+def per_call_verify(token: str):
+    TokenGenerator(key=KEYS).decrypt(token)
+
+
+def measure(func, *args) -> float:
+    start = time.perf_counter()
+    for _ in range(CALLS_COUNT):
+        func(*args)
+    return CALLS_COUNT / (time.perf_counter() - start)
+
+
+def main():
+    token_generator = TokenGenerator(key=KEYS)
+    primary_token = token_generator.encrypt("{\"user_id\": \"user-1\"}").data
+    secondary_token = TokenGenerator(key=SECONDARY_KEY).encrypt("{\"user_id\": \"user-1\"}").data
+
+    results = [
+        ("encrypt, per call", measure(per_call_encrypt)),
+        ("encrypt, shared ring", measure(token_generator.encrypt, "{\"user_id\": \"user-1\"}")),
+        ("verify primary key, per call", measure(per_call_verify, primary_token)),
+        ("verify primary key, shared ring", measure(token_generator.decrypt, primary_token)),
+        ("verify secondary key, per call", measure(per_call_verify, secondary_token)),
+        ("verify secondary key, shared ring", measure(token_generator.decrypt, secondary_token)),
+    ]
+
+    print("{0:<40} {1:>12}".format("operation", "calls/sec"))
+    for name, throughput in results:
+        print("{0:<40} {1:>12.1f}".format(name, throughput))
+
+
+if __name__ == "__main__":
+    main()
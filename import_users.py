@@ -0,0 +1,31 @@
+import csv
+import json
+import sys
+
+from sqlalchemy import create_engine
+
+from service.user_import import UserImport
+from src.user.user_repository import get_user_repository
+
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+db_url = os.getenv("DB_URL")
+
+# Usage: python import_users.py users.csv
+# CSV header: user_name,password,roles,deposit with roles separated by ';', a .jsonl file holds a JSON object per line.
+file_path = sys.argv[1]
+batch_size = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+
+engine = create_engine(db_url, future=True)
+user_import = UserImport(user_repository=get_user_repository(engine))
+
+with open(file_path, newline="") as f:
+    if file_path.endswith(".jsonl") or file_path.endswith(".ndjson"):
+        res = user_import.import_users((line for line in f if line.strip()), batch_size=batch_size, decode=json.loads)
+    else:
+        res = user_import.import_users(csv.DictReader(f), batch_size=batch_size)
+
+print(json.dumps(res.data, indent=2))
@@ -1,8 +1,9 @@
 from api import app
-from api.sign_up import sign_up
-from api.sign_in import sign_in
-from api.products import *
-from api.vending_machines import *
-from api.admin import *
+import api.sign_up
+import api.sign_in
+import api.sign_out
+import api.products
+import api.vending_machines
+import api.admin
 
 app.run(host="127.0.0.1", port=5000)
@@ -0,0 +1,100 @@
+import json
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from service.authentication.token_generator import TokenGenerator
+from service.base_service_response import ServiceResponse as Response
+from src.user.user import User, Role
+from src.user.user_repository import session_user_cache
+
+USER_ID_TOKEN_FORMAT = "user_id"
+CLAIMS_TOKEN_FORMAT = "claims"
+
+
+class TokenVersions:
+    # In memory per user token version table, bumping a user version revokes every claims token issued before it.
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._versions: Dict[str, int] = {}
+
+    def current(self, user_id: str) -> int:
+        return self._versions.get(user_id, 0)
+
+    def revoke(self, user_id: str) -> int:
+        with self._lock:
+            version = self._versions.get(user_id, 0) + 1
+            self._versions[user_id] = version
+            return version
+
+    def clear(self) -> None:
+        with self._lock:
+            self._versions.clear()
+
+
+token_versions = TokenVersions()
+
+
+def revoke_user_tokens(user_id: str) -> None:
+    token_versions.revoke(user_id)
+    session_user_cache.invalidate_tag(user_id)
+
+
+class SessionToken:
+    def __init__(self, token_generator: TokenGenerator, token_format: str = USER_ID_TOKEN_FORMAT, ttl: int = 3600,
+                 versions: TokenVersions = token_versions, clock: Callable[[], float] = time.time):
+        self.token_generator = token_generator
+        self.token_format = token_format
+        self.ttl = ttl
+        self.versions = versions
+        self.clock = clock
+
+    def issue(self, user_id: str, roles: Optional[List[str]] = None, is_admin: bool = False) -> Response:
+        if self.token_format != CLAIMS_TOKEN_FORMAT:
+            return self.token_generator.encrypt(json.dumps({"user_id": user_id}))
+
+        issued_at = int(self.clock())
+        claims = {
+            "user_id": user_id,
+            "roles": roles or [],
+            "is_admin": is_admin,
+            "iat": issued_at,
+            "exp": issued_at + self.ttl,
+            "ver": self.versions.current(user_id)
+        }
+        return self.token_generator.encrypt(json.dumps(claims))
+
+    def verify(self, token: str) -> Optional[Dict]:
+        # Returns the token content along with the id of the key which verified it, claims tokens are only returned
+        # while not expired nor revoked.
+        if not token:
+            return None
+
+        res, key_id = self.token_generator.decrypt_with_key_id(token)
+        if not res.success:
+            return None
+
+        content: Dict = json.loads(res.data)
+        if not content.get("user_id", None):
+            return None
+        content["key_id"] = key_id
+
+        if is_claims(content):
+            if content["exp"] <= self.clock():
+                return None
+
+            if content["ver"] != self.versions.current(content["user_id"]):
+                return None
+
+        return content
+
+
+def is_claims(content: Dict) -> bool:
+    return "ver" in content
+
+
+def principal_from_claims(content: Dict) -> User:
+    # Identity built from the token alone, enough for role & admin checks but it doesn't carry the user deposit.
+    user_id = content["user_id"]
+    roles = [Role(name=it, user_id=user_id) for it in content["roles"]]
+    return User(id=user_id, is_admin=content["is_admin"], roles=roles)
@@ -1,4 +1,4 @@
-from src.user.user import User
+from src.user.user import verify_password, password_needs_rehash
 from src.user.user_repository import UserRepository
 
 from service.base_service_response import ServiceResponse as Response
@@ -9,13 +9,18 @@ class SignIn:
         self.user_repository = user_repository
 
     def sign_in(self, user_name: str, password: str) -> Response:
-        user: User = self.user_repository.get_by_user_name(user_name=user_name)
-        if not user:
+        credentials = self.user_repository.get_credentials_by_user_name(user_name=user_name)
+        if not credentials:
             return Response(success=False, message="User Name {0} doesn't exist".format(user_name))
 
-        is_correct_password = self.user_repository.validate_user_password(user_id=user.id, password=password)
+        user_id, hashed_password = credentials
+        is_correct_password = verify_password(password=password, hashed_password=hashed_password)
 
         if not is_correct_password:
             return Response(success=False, message="Incorrect password for user name {0}".format(user_name))
 
-        return Response(success=True, data={"user_id": user.id})
+        if password_needs_rehash(hashed_password):
+            # Upgrade legacy & outdated hashes while the plain password is known.
+            self.user_repository.set_user_password(user_id=user_id, password=password)
+
+        return Response(success=True, data={"user_id": user_id})
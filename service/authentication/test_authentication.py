@@ -3,14 +3,18 @@ from typing import Optional, List
 from unittest import TestCase
 
 from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
 
+from service.authentication.session_token import SessionToken, TokenVersions, CLAIMS_TOKEN_FORMAT
 from service.authentication.sign_in import SignIn
 from service.authentication.sign_up import SignUp
-from service.authentication.token_generator import TokenGenerator
+from service.authentication.token_generator import TokenGenerator, get_key_id
 from service.base_service_response import ServiceResponse
 from src import Base
+from src.base.statement_recorder import record_statements
 from src.user.db_role import DbRole
 from src.user.db_user import DbUser
+from src.user.password_hasher import Sha256PasswordHasher
 from src.user.mapper import UserMapper
 from src.user.user import User, Role
 from src.user.user_repository import UserRepository
@@ -82,6 +86,41 @@ class TestSignIn(TestCase):
         self.assertEqual(type(res), ServiceResponse)
         self.assertEqual(res.success, True)
 
+    def test_signin_credentials_check_is_a_single_query(self):
+        user: User = User(name="test@test.com", roles=[Role(name="Buyer")])
+        self.user_repository.insert(user)
+        self.user_repository.set_user_password(user_id=user.id, password="12345678")
+
+        sign_in_service = SignIn(user_repository=self.user_repository)
+        with record_statements(self.engine) as queries:
+            res = sign_in_service.sign_in(user_name="test@test.com", password="12345678")
+
+        self.assertEqual(res.success, True)
+        self.assertEqual(res.data["user_id"], user.id)
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn("Role", queries[0])
+
+    def test_signin_rehashes_legacy_password(self):
+        user: User = User(name="test@test.com")
+        self.user_repository.insert(user)
+
+        legacy_password = Sha256PasswordHasher().encode("12345678")
+        with Session(self.engine) as session:
+            session.get(DbUser, user.id).password = legacy_password
+            session.commit()
+
+        sign_in_service = SignIn(user_repository=self.user_repository)
+        res = sign_in_service.sign_in(user_name="test@test.com", password="12345678")
+        self.assertEqual(res.success, True)
+
+        with Session(self.engine) as session:
+            password = session.get(DbUser, user.id).password
+        self.assertNotEqual(password, legacy_password)
+        self.assertTrue(password.startswith("pbkdf2_sha256$"))
+
+        res = sign_in_service.sign_in(user_name="test@test.com", password="12345678")
+        self.assertEqual(res.success, True)
+
     def test_signin_with_wrong_username(self):
         sign_in_service = SignIn(user_repository=self.user_repository)
         res = sign_in_service.sign_in(user_name="test@test.com", password="12345678")
@@ -157,3 +196,80 @@ class TestTokenGenerator(TestCase):
         response = wrong_token_generator.decrypt(response.data)
         
         self.assertFalse(response.success)
+
+    def test_decrypt_with_rotated_keys(self):
+        old_key = "DK2zBekJCArhrituq6sc5sfAF8pQTkKut3D1mp9_GhI="
+        new_key = "X1Ul7Y3aR4ITazL-LzZSqVdhq8MIORbUZE-WmmTzjaA="
+        token_generator = TokenGenerator(key=old_key)
+        old_token = token_generator.encrypt("Test Sample 123").data
+
+        token_generator.rotate(new_key)
+        new_token = token_generator.encrypt("Test Sample 456").data
+
+        response, key_id = token_generator.decrypt_with_key_id(old_token)
+        self.assertTrue(response.success)
+        self.assertEqual(response.data, "Test Sample 123")
+        self.assertEqual(key_id, get_key_id(old_key))
+
+        response, key_id = token_generator.decrypt_with_key_id(new_token)
+        self.assertTrue(response.success)
+        self.assertEqual(key_id, get_key_id(new_key))
+
+        self.assertFalse(TokenGenerator(key=old_key).decrypt(new_token).success)
+
+        token_generator.set_keys(new_key)
+        self.assertFalse(token_generator.decrypt(old_token).success)
+        self.assertEqual(token_generator.key_usage[get_key_id(old_key)], 1)
+
+    def test_key_ring_from_comma_separated_keys(self):
+        new_key = "X1Ul7Y3aR4ITazL-LzZSqVdhq8MIORbUZE-WmmTzjaA="
+        old_key = "DK2zBekJCArhrituq6sc5sfAF8pQTkKut3D1mp9_GhI="
+        old_token = TokenGenerator(key=old_key).encrypt("Test Sample").data
+
+        token_generator = TokenGenerator(key="{0}, {1}".format(new_key, old_key))
+
+        self.assertEqual(token_generator.key_ids, [get_key_id(new_key), get_key_id(old_key)])
+        self.assertTrue(token_generator.decrypt(old_token).success)
+        self.assertTrue(TokenGenerator(key=new_key).decrypt(token_generator.encrypt("Test Sample").data).success)
+
+
+class TestSessionToken(TestCase):
+    def setUp(self):
+        self.key = "DK2zBekJCArhrituq6sc5sfAF8pQTkKut3D1mp9_GhI="
+        self.now = 1000
+        self.versions = TokenVersions()
+        self.session_token = SessionToken(token_generator=TokenGenerator(key=self.key),
+                                          token_format=CLAIMS_TOKEN_FORMAT, ttl=60, versions=self.versions,
+                                          clock=lambda: self.now)
+
+    def test_user_id_token(self):
+        session_token = SessionToken(token_generator=TokenGenerator(key=self.key))
+        token = session_token.issue(user_id="user-1", roles=["Buyer"]).data
+
+        content = session_token.verify(token)
+
+        self.assertEqual(content, {"user_id": "user-1", "key_id": get_key_id(self.key)})
+
+    def test_claims_token(self):
+        token = self.session_token.issue(user_id="user-1", roles=["Buyer"], is_admin=False).data
+
+        content = self.session_token.verify(token)
+
+        self.assertEqual(content["user_id"], "user-1")
+        self.assertEqual(content["roles"], ["Buyer"])
+        self.assertFalse(content["is_admin"])
+        self.assertEqual(content["iat"], 1000)
+        self.assertEqual(content["exp"], 1060)
+
+    def test_expired_claims_token(self):
+        token = self.session_token.issue(user_id="user-1").data
+        self.now = 1060
+
+        self.assertIsNone(self.session_token.verify(token))
+
+    def test_revoked_claims_token(self):
+        token = self.session_token.issue(user_id="user-1").data
+        self.versions.revoke("user-1")
+
+        self.assertIsNone(self.session_token.verify(token))
+        self.assertTrue(self.session_token.verify(self.session_token.issue(user_id="user-1").data))
@@ -1,24 +1,88 @@
-from typing import Callable, Tuple, Optional
+import hashlib
+import threading
+from typing import Dict, List, Optional, Tuple, Union
 
 from cryptography.fernet import Fernet, InvalidToken
 
 from service.base_service_response import ServiceResponse as Response
 
 
+def get_key_id(key: str) -> str:
+    # Short fingerprint to tell the keys apart without exposing them.
+    return hashlib.sha256(key.encode('ascii')).hexdigest()[:8]
+
+
 class TokenGenerator:
-    def __init__(self, key: str):
-        f = Fernet(key.encode('ascii'))
-        self.encryptor: Callable = f.encrypt
-        self.decryptor: Callable = f.decrypt
+    # Key ring, tokens are encrypted with the first (primary) key and verified by any of the keys, so the secret can
+    # be rotated by putting the new key first while tokens issued with the old one stay valid until it's removed.
+    # Built once per process, the Fernet instances are reused by every request.
+    def __init__(self, key: Union[str, List[str]]):
+        self._lock = threading.Lock()
+        self._keys: Tuple[Tuple[str, Fernet], ...] = ()
+        self.key_usage: Dict[str, int] = {}
+        self.set_keys(key)
+
+    @property
+    def key_ids(self) -> List[str]:
+        return [key_id for key_id, _ in self._keys]
+
+    def set_keys(self, key: Union[str, List[str]]) -> None:
+        keys = [it.strip() for it in key.split(",")] if isinstance(key, str) else key
+        keys = [it for it in keys if it]
+        if not keys:
+            raise ValueError("At least one token key is required")
+
+        ring = tuple((get_key_id(it), Fernet(it.encode('ascii'))) for it in keys)
+        with self._lock:
+            self._keys = ring
+
+    def rotate(self, key: str) -> None:
+        # The new key becomes the primary one, the previous keys are kept for verification.
+        new_key_id = get_key_id(key)
+        ring = ((new_key_id, Fernet(key.encode('ascii'))),) + tuple(
+            it for it in self._keys if it[0] != new_key_id)
+        with self._lock:
+            self._keys = ring
 
     def encrypt(self, text: str) -> Response:
         try:
-            return Response(success=True, data=self.encryptor(text.encode('ascii')).decode('ascii'))
+            _, primary = self._keys[0]
+            return Response(success=True, data=primary.encrypt(text.encode('ascii')).decode('ascii'))
         except Exception as e:
             return Response(success=False)
 
     def decrypt(self, cypher_text: str) -> Response:
+        res, _ = self.decrypt_with_key_id(cypher_text)
+        return res
+
+    def decrypt_with_key_id(self, cypher_text: str) -> Tuple[Response, Optional[str]]:
         try:
-            return Response(success=True, data=self.decryptor(cypher_text.encode('ascii')).decode('ascii'))
+            token = cypher_text.encode('ascii')
         except Exception as e:
-            return Response(success=False)
+            return Response(success=False), None
+
+        for key_id, fernet in self._keys:
+            try:
+                text = fernet.decrypt(token).decode('ascii')
+            except InvalidToken as e:
+                continue
+            except Exception as e:
+                return Response(success=False), None
+
+            self._count_usage(key_id)
+            return Response(success=True, data=text), key_id
+
+        return Response(success=False), None
+
+    def use_key(self, key_id: str) -> bool:
+        # For tokens verified before, e.g. cached, counts the key usage while it's still in the ring. Returns False
+        # once the key was removed, the token must not be accepted anymore.
+        if all(it != key_id for it, _ in self._keys):
+            return False
+
+        self._count_usage(key_id)
+        return True
+
+    def _count_usage(self, key_id: str) -> None:
+        with self._lock:
+            self.key_usage[key_id] = self.key_usage.get(key_id, 0) + 1
@@ -1,35 +1,62 @@
-from typing import Tuple, Optional, Callable
+import copy
+import time
+from typing import Tuple, Optional, Callable, Dict
 
-from api import authentication_secret_key, engine
-from service.authentication.token_generator import TokenGenerator
-from src.user.user import User
-from src.user.user_repository import get_user_repository
-import json
+from api import container, session_token as default_session_token
+from service.authentication.session_token import SessionToken, is_claims, principal_from_claims
+from src.user.user import User, ROLE_BITS
+from src.user.user_repository import UserRepository, session_user_cache
 
 
 class Authorize:
-    def __init__(self, request):
+    def __init__(self, request, user_repository: Optional[UserRepository] = None,
+                 session_token: Optional[SessionToken] = None):
         self.request = request
+        self.user_repository = user_repository or container.user_repository
+        self.session_token = session_token or default_session_token
+
+        # Request scoped identity, the token is resolved to the session user once and reused by every check.
+        self._identity: Optional[Tuple[bool, Optional[User]]] = None
+        self._principal: Optional[Tuple[bool, Optional[User]]] = None
+        self._verified_tokens: Dict[str, Optional[Dict]] = {}
 
     def is_authorized(self) -> Tuple[bool, Optional[User]]:
-        token = self.request.headers.get("token")
+        if self._identity is None:
+            token = self.request.headers.get("token")
+            self._identity = self.get_user_from_token(token=token)
+
+        return self._identity
+
+    def get_principal(self) -> Tuple[bool, Optional[User]]:
+        # The identity used for role & admin checks, claims tokens are decided from the token without loading the user.
+        if self._principal is None:
+            token = self.request.headers.get("token")
+            content = self._verify_token(token)
+            if content and is_claims(content):
+                self._principal = True, principal_from_claims(content)
+            else:
+                self._principal = self.is_authorized()
+
+        return self._principal
 
-        return self.get_user_from_token(token=token)
+    def has_claims_token(self) -> bool:
+        # Only claims tokens carry a version, user_id tokens stay valid until the key which signed them is removed.
+        content = self._verify_token(self.request.headers.get("token"))
+        return bool(content) and is_claims(content)
 
     def has_permission(self, permission_func: Callable, **kwargs) -> Tuple[bool, str]:
-        valid, user = self.is_authorized()
+        valid, user = self.get_principal()
         if not valid:
             return False, "Not authorized"
 
-        is_admin, _ = self.is_admin()
-        if is_admin:
+        if user.is_admin:
             return True, ""
 
         _has_perm, message = permission_func(user=user, **kwargs)
         return _has_perm, message
 
     def is_admin(self) -> Tuple[bool, str]:
-        valid, user = self.is_authorized()
+        valid, user = self.get_principal()
         if not valid:
             return False, "Not authorized"
 
@@ -41,9 +68,14 @@ class Authorize:
     def has_role(self, role: str) -> Tuple[bool, str]:
         return self.has_permission(self._has_role, role=role)
 
+    def has_roles_mask(self, mask: int, role: str) -> Tuple[bool, str]:
+        return self.has_permission(self._has_roles_mask, mask=mask, role=role)
+
     def _has_role(self, user: User, role: str) -> Tuple[bool, str]:
-        valid: bool = any(it.name == role for it in user.roles)
-        if not valid:
+        return self._has_roles_mask(user=user, mask=ROLE_BITS.get(role, 0), role=role)
+
+    def _has_roles_mask(self, user: User, mask: int, role: str) -> Tuple[bool, str]:
+        if not user.has_roles_mask(mask):
             return False, "Must have {0} permission to complete this action.".format(role)
         return True, ""
 
@@ -51,17 +83,32 @@ class Authorize:
         if not token:
             return False, None
 
-        token_generator = TokenGenerator(key=authentication_secret_key)
-        res = token_generator.decrypt(token)
-        if res.success:
-            _dict = json.loads(res.data)
-            user_id = _dict.get("user_id", None)
-            if not user_id:
-                return False, None
-            user_repository = get_user_repository(engine)
-            user = user_repository.get_by_id(_id=user_id)
-            if not user:
-                return False, None
-
-            return True, user
-        return False, None
+        # Entries hold the id of the key which verified the token, a token signed by a key removed from the ring since
+        # is verified again, and rejected.
+        cached: Optional[Tuple[User, Optional[float], str]] = session_user_cache.get(token)
+        if cached:
+            cached_user, expires_at, key_id = cached
+            if (expires_at is None or expires_at > time.time()) and \
+                    self.session_token.token_generator.use_key(key_id):
+                # Handlers mutate the session user, so never hand out the cached snapshot itself.
+                return True, copy.deepcopy(cached_user)
+
+        content: Optional[Dict] = self._verify_token(token)
+        if not content:
+            return False, None
+
+        # Read before loading, a write to the user while it's loaded invalidates the tag & the loaded user isn't cached.
+        generation = session_user_cache.generation(content["user_id"])
+        user = self.user_repository.get_session_user(_id=content["user_id"])
+        if not user:
+            return False, None
+
+        session_user_cache.set(token, (copy.deepcopy(user), content.get("exp", None), content["key_id"]), tag=user.id,
+                               generation=generation)
+        return True, user
+
+    def _verify_token(self, token: str) -> Optional[Dict]:
+        if token not in self._verified_tokens:
+            self._verified_tokens[token] = self.session_token.verify(token)
+
+        return self._verified_tokens[token]
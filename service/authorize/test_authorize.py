@@ -0,0 +1,219 @@
+import json
+from typing import Optional
+from unittest import TestCase
+
+from sqlalchemy import create_engine
+
+from service.authentication.session_token import SessionToken, CLAIMS_TOKEN_FORMAT, revoke_user_tokens
+from service.authentication.token_generator import TokenGenerator
+from service.authorize.authorize import Authorize
+from src import Base
+from src.base.statement_recorder import record_statements
+from src.user.db_role import DbRole
+from src.user.db_user import DbUser
+from src.user.mapper import UserMapper
+from src.user.user import User, Role
+from src.user.user_repository import UserRepository, session_user_cache
+
+
+class FakeRequest:
+    def __init__(self, headers=None):
+        self.headers = headers or {}
+
+
+class TestAuthorize(TestCase):
+    def setUp(self):
+        db_url = "sqlite+pysqlite:///:memory:"
+        self.engine = create_engine(db_url, future=True, echo=True)
+        Base.metadata.create_all(self.engine)
+
+        mapped_entities = [
+            (User, DbUser),
+            (Role, DbRole)
+        ]
+        mapper = UserMapper(mapped_entities=mapped_entities)
+
+        self.user_repository = UserRepository(engine=self.engine, mapper=mapper)
+        self.key = "DK2zBekJCArhrituq6sc5sfAF8pQTkKut3D1mp9_GhI="
+        self.token_generator = TokenGenerator(key=self.key)
+        self.session_token = SessionToken(token_generator=self.token_generator)
+
+        session_user_cache.clear()
+
+        recorder = record_statements(self.engine)
+        self.queries = recorder.__enter__()
+        self.addCleanup(recorder.__exit__, None, None, None)
+
+    def test_identity_is_resolved_once_per_request(self):
+        user = User(name="test@test.com", roles=[Role(name="Buyer")])
+        self.user_repository.insert(user)
+
+        authorizer = self._get_authorizer(user_id=user.id)
+
+        self.queries.clear()
+        valid, session_user = authorizer.is_authorized()
+        self.assertTrue(valid)
+        self.assertEqual(session_user.id, user.id)
+        queries_per_resolution = len(self.queries)
+
+        self.assertTrue(authorizer.has_role(role="Buyer")[0])
+        self.assertFalse(authorizer.has_role(role="Seller")[0])
+        self.assertFalse(authorizer.is_admin()[0])
+        self.assertTrue(authorizer.is_authorized()[0])
+
+        self.assertEqual(len(self.queries), queries_per_resolution)
+
+    def test_role_check_before_identity_resolution(self):
+        user = User(name="test@test.com", roles=[Role(name="Buyer")])
+        self.user_repository.insert(user)
+
+        authorizer = self._get_authorizer(user_id=user.id)
+
+        self.queries.clear()
+        valid, message = authorizer.has_role(role="Buyer")
+        self.assertTrue(valid)
+        queries_per_resolution = len(self.queries)
+
+        authorizer.is_authorized()
+        authorizer.is_admin()
+
+        self.assertEqual(len(self.queries), queries_per_resolution)
+
+    def test_missing_token(self):
+        authorizer = Authorize(FakeRequest(), user_repository=self.user_repository, session_token=self.session_token)
+
+        valid, user = authorizer.is_authorized()
+
+        self.assertFalse(valid)
+        self.assertIsNone(user)
+        self.assertFalse(self.queries)
+
+    def test_session_user_is_cached_across_requests(self):
+        user = User(name="test@test.com", roles=[Role(name="Buyer")])
+        self.user_repository.insert(user)
+        token = self._get_token(user_id=user.id)
+
+        self._get_authorizer(token=token).is_authorized()
+
+        self.queries.clear()
+        valid, session_user = self._get_authorizer(token=token).is_authorized()
+
+        self.assertTrue(valid)
+        self.assertEqual(session_user.id, user.id)
+        self.assertTrue(session_user.has_role("Buyer"))
+        self.assertFalse(self.queries)
+
+    def test_user_write_invalidates_cached_session_user(self):
+        user = User(name="test@test.com", deposit=0, roles=[Role(name="Buyer")])
+        self.user_repository.insert(user)
+        token = self._get_token(user_id=user.id)
+
+        _, session_user = self._get_authorizer(token=token).is_authorized()
+        session_user.deposit = 50
+        self.user_repository.insert(session_user)
+
+        user = self.user_repository.get_by_id(_id=user.id)
+        user.add_role("Seller")
+        self.user_repository.insert(user)
+
+        _, session_user = self._get_authorizer(token=token).is_authorized()
+
+        self.assertEqual(session_user.deposit, 50)
+        self.assertTrue(self._get_authorizer(token=token).has_role(role="Seller")[0])
+        self.assertEqual(sorted(it.name for it in self.user_repository.get_by_id(_id=user.id).roles),
+                         ["Buyer", "Seller"])
+
+    def test_session_user_is_loaded_without_roles_table(self):
+        user = User(name="test@test.com", roles=[Role(name="Buyer")])
+        self.user_repository.insert(user)
+
+        self.queries.clear()
+        valid, session_user = self._get_authorizer(user_id=user.id).is_authorized()
+
+        self.assertTrue(valid)
+        self.assertEqual(len(self.queries), 1)
+        self.assertNotIn("Role", self.queries[0])
+        self.assertTrue(session_user.has_role("Buyer"))
+        self.assertFalse(session_user.has_role("Seller"))
+
+    def test_claims_token_role_checks_without_user_queries(self):
+        user = User(name="test@test.com", roles=[Role(name="Seller")])
+        self.user_repository.insert(user)
+        token = self._get_claims_token(user=user)
+
+        self.queries.clear()
+        authorizer = self._get_authorizer(token=token)
+
+        self.assertTrue(authorizer.has_role(role="Seller")[0])
+        self.assertFalse(authorizer.has_role(role="Buyer")[0])
+        self.assertFalse(authorizer.is_admin()[0])
+        self.assertFalse(self.queries)
+
+        valid, session_user = authorizer.is_authorized()
+        self.assertTrue(valid)
+        self.assertEqual(session_user.id, user.id)
+
+    def test_revoked_claims_token(self):
+        user = User(name="test@test.com", roles=[Role(name="Seller")])
+        self.user_repository.insert(user)
+        token = self._get_claims_token(user=user)
+        self._get_authorizer(token=token).is_authorized()
+
+        revoke_user_tokens(user_id=user.id)
+
+        authorizer = self._get_authorizer(token=token)
+        self.assertFalse(authorizer.has_role(role="Seller")[0])
+        self.assertFalse(authorizer.is_authorized()[0])
+
+    def test_cached_token_of_a_removed_key(self):
+        user = User(name="test@test.com", roles=[Role(name="Buyer")])
+        self.user_repository.insert(user)
+        token = self._get_token(user_id=user.id)
+        key_id = self.token_generator.key_ids[0]
+
+        self._get_authorizer(token=token).is_authorized()
+        self.assertTrue(self._get_authorizer(token=token).is_authorized()[0])
+        # Cache hits count as uses of the key too.
+        self.assertEqual(self.token_generator.key_usage[key_id], 2)
+
+        self.token_generator.set_keys("3Q8pGZ0Xbq8Ax9i9kqZGgJtyWJ6Z5hY3CwtYH0KnqsU=")
+
+        self.assertFalse(self._get_authorizer(token=token).is_authorized()[0])
+
+    def test_user_write_during_the_load_is_not_cached(self):
+        user = User(name="test@test.com", deposit=0, roles=[Role(name="Buyer")])
+        self.user_repository.insert(user)
+        token = self._get_token(user_id=user.id)
+
+        get_session_user = self.user_repository.get_session_user
+
+        def get_session_user_then_write(_id):
+            stale = get_session_user(_id=_id)
+            # Another request writes the user after the load but before the cache fill.
+            written = self.user_repository.get_by_id(_id=_id)
+            written.deposit = 50
+            self.user_repository.insert(written)
+            return stale
+
+        self.user_repository.get_session_user = get_session_user_then_write
+        _, session_user = self._get_authorizer(token=token).is_authorized()
+        self.assertEqual(session_user.deposit, 0)
+        del self.user_repository.get_session_user
+
+        self.queries.clear()
+        _, session_user = self._get_authorizer(token=token).is_authorized()
+
+        self.assertTrue(self.queries)
+        self.assertEqual(session_user.deposit, 50)
+
+    def _get_claims_token(self, user: User) -> str:
+        session_token = SessionToken(token_generator=self.token_generator, token_format=CLAIMS_TOKEN_FORMAT)
+        return session_token.issue(user_id=user.id, roles=[it.name for it in user.roles], is_admin=user.is_admin).data
+
+    def _get_token(self, user_id: str) -> str:
+        return self.token_generator.encrypt(json.dumps({"user_id": user_id})).data
+
+    def _get_authorizer(self, user_id: Optional[str] = None, token: Optional[str] = None) -> Authorize:
+        token = token or self._get_token(user_id=user_id)
+        return Authorize(FakeRequest(headers={"token": token}), user_repository=self.user_repository,
+                         session_token=self.session_token)
@@ -1,6 +1,22 @@
+import json
+import os
+import tempfile
+import threading
 from unittest import TestCase
 
-from service.vending_machine import validate_deposit
+from sqlalchemy import create_engine
+
+from service.authentication.session_token import SessionToken
+from service.authentication.token_generator import TokenGenerator
+from service.authorize.authorize import Authorize
+from service.vending_machine import validate_deposit, VendingMachineService
+from src import Base
+from src.base.statement_recorder import record_commits
+from src.product.db_product import DbProduct
+from src.user.user import User, Role
+from src.user.user_repository import get_user_repository, session_user_cache
+from src.vending_machine.vending_machine import VendingMachine, VendingMachineInventory, VendingMachineException
+from src.vending_machine.vending_machine_repository import get_vending_machine_repository
 
 
 class TestVendingMachineService(TestCase):
@@ -15,3 +31,118 @@ class TestVendingMachineService(TestCase):
         for it in true_test_cases:
             res, message = validate_deposit(it)
             self.assertTrue(res)
+
+
+class TestBuyProduct(TestCase):
+    def setUp(self):
+        db_url = "sqlite+pysqlite:///:memory:"
+        self.engine = create_engine(db_url, future=True, echo=True)
+        Base.metadata.create_all(self.engine)
+
+        self.user_repository = get_user_repository(self.engine)
+        self.vending_machine_repository = get_vending_machine_repository(self.engine)
+        self.vending_machine_service = VendingMachineService(user_repository=self.user_repository,
+                                                             vending_machine_repository=self.vending_machine_repository)
+
+        self.user = User(name="Test User 1", deposit=50, roles=[Role(name="Buyer")])
+        self.user_repository.insert(self.user)
+        inventory = [
+            VendingMachineInventory(product_id="product-1", seller_id=self.user.id, amount_available=10, cost=5)
+        ]
+        self.vending_machine = VendingMachine(name="Vending Machine 1", model_number="FAKE MODEL 1",
+                                              location="Cairo", inventory=inventory)
+        self.vending_machine_repository.insert(self.vending_machine)
+
+    def test_buy_product_commits_once(self):
+        with record_commits(self.engine) as commits:
+            res = self.vending_machine_service.buy_product(user=self.user, vending_machine=self.vending_machine,
+                                                           product_id="product-1", qty=2)
+
+        self.assertTrue(res.success)
+        self.assertEqual(len(commits), 1)
+        self.assertEqual(self.user_repository.get_by_id(self.user.id).deposit, 40)
+        self.assertEqual(self.vending_machine_repository.get_by_id(self.vending_machine.id).inventory[0]
+                         .amount_available, 8)
+
+    def test_buy_product_rolls_back_on_domain_exception(self):
+        def failing_take_stock(*args, **kwargs):
+            raise VendingMachineException("Failed to write the vending machine")
+
+        self.vending_machine_repository.take_stock = failing_take_stock
+
+        res = self.vending_machine_service.buy_product(user=self.user, vending_machine=self.vending_machine,
+                                                       product_id="product-1", qty=2)
+
+        self.assertFalse(res.success)
+        self.assertEqual(self.user_repository.get_by_id(self.user.id).deposit, 50)
+
+    def test_buy_product_checks_the_current_deposit(self):
+        # The user was loaded before another purchase spent most of the deposit.
+        self.user_repository.add_deposit(user_id=self.user.id, amount=-45)
+
+        res = self.vending_machine_service.buy_product(user=self.user, vending_machine=self.vending_machine,
+                                                       product_id="product-1", qty=2)
+
+        self.assertFalse(res.success)
+        self.assertEqual(self.user_repository.get_by_id(self.user.id).deposit, 5)
+        self.assertEqual(self.vending_machine_repository.get_by_id(self.vending_machine.id).inventory[0]
+                         .amount_available, 10)
+
+
+class FakeRequest:
+    def __init__(self, headers=None):
+        self.headers = headers or {}
+
+
+class TestBuyProductSessionUser(TestCase):
+    def setUp(self):
+        # A database file, so another thread reads the committed rows rather than the pending unit of work.
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.engine = create_engine("sqlite+pysqlite:///{0}".format(os.path.join(tmp_dir.name, "test.db")),
+                                    future=True)
+        self.addCleanup(self.engine.dispose)
+        Base.metadata.create_all(self.engine)
+
+        self.user_repository = get_user_repository(self.engine)
+        self.vending_machine_repository = get_vending_machine_repository(self.engine)
+        self.vending_machine_service = VendingMachineService(user_repository=self.user_repository,
+                                                             vending_machine_repository=self.vending_machine_repository)
+
+        self.user = User(name="Test User 1", deposit=50, roles=[Role(name="Buyer")])
+        self.user_repository.insert(self.user)
+        inventory = [
+            VendingMachineInventory(product_id="product-1", seller_id=self.user.id, amount_available=10, cost=5)
+        ]
+        self.vending_machine = VendingMachine(name="Vending Machine 1", model_number="FAKE MODEL 1",
+                                              location="Cairo", inventory=inventory)
+        self.vending_machine_repository.insert(self.vending_machine)
+
+        token_generator = TokenGenerator(key="DK2zBekJCArhrituq6sc5sfAF8pQTkKut3D1mp9_GhI=")
+        self.session_token = SessionToken(token_generator=token_generator)
+        self.token = token_generator.encrypt(json.dumps({"user_id": self.user.id})).data
+        session_user_cache.clear()
+
+    def test_session_user_loaded_before_the_commit_is_not_cached(self):
+        take_stock = self.vending_machine_repository.take_stock
+        loaded = []
+
+        def take_stock_while_another_request_loads_the_user(*args, **kwargs):
+            # The deposit is charged but not committed yet, another request loads & caches the committed user.
+            thread = threading.Thread(target=lambda: loaded.append(self._get_session_user()))
+            thread.start()
+            thread.join()
+            return take_stock(*args, **kwargs)
+
+        self.vending_machine_repository.take_stock = take_stock_while_another_request_loads_the_user
+        res = self.vending_machine_service.buy_product(user=self.user, vending_machine=self.vending_machine,
+                                                       product_id="product-1", qty=2)
+
+        self.assertTrue(res.success)
+        self.assertEqual(loaded[0].deposit, 50)
+        self.assertEqual(self._get_session_user().deposit, 40)
+
+    def _get_session_user(self) -> User:
+        authorizer = Authorize(FakeRequest(headers={"token": self.token}), user_repository=self.user_repository,
+                               session_token=self.session_token)
+        return authorizer.is_authorized()[1]
@@ -0,0 +1,69 @@
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from service.base_service_response import ServiceResponse as Response
+from src.base.money import parse_cents
+from src.user.user import User, Role
+from src.user.user_repository import UserRepository
+
+VALID_ROLES = ["Seller", "Buyer"]
+
+
+def parse_user_row(row: Any) -> Tuple[Optional[Tuple[User, str]], str]:
+    if not isinstance(row, dict):
+        return None, "Invalid row, a JSON object is required"
+
+    user_name = row.get("user_name", None)
+    password = row.get("password", None)
+    if not user_name or not password:
+        return None, "user_name & password are required"
+
+    roles = row.get("roles", None) or []
+    if isinstance(roles, str):
+        roles = [it.strip() for it in roles.split(";") if it.strip()]
+
+    invalid_roles = [it for it in roles if it not in VALID_ROLES]
+    if invalid_roles:
+        return None, "Invalid roles {0}, role must be Seller or Buyer".format(invalid_roles)
+
+    try:
+        deposit = parse_cents(row.get("deposit", None) or 0)
+    except ValueError as e:
+        return None, "Invalid deposit {0}".format(row["deposit"])
+
+    user = User(name=user_name, deposit=deposit, roles=[Role(name=it) for it in roles])
+    return (user, password), ""
+
+
+class UserImport:
+    def __init__(self, user_repository: UserRepository):
+        self.user_repository = user_repository
+
+    def import_users(self, rows: Iterable, batch_size: int = 500,
+                     decode: Optional[Callable[[Any], Any]] = None) -> Response:
+        # decode turns each raw row into its dict, e.g. json.loads for newline delimited JSON lines. Rows which can't be
+        # decoded or parsed are reported as invalid, the valid ones are still imported.
+        invalid_rows: List[Dict] = []
+
+        def valid_users() -> Iterator[Tuple[User, str]]:
+            for index, row in enumerate(rows):
+                if decode:
+                    try:
+                        row = decode(row)
+                    except ValueError as e:
+                        invalid_rows.append({"row": index, "message": "Invalid JSON, {0}".format(e)})
+                        continue
+
+                parsed_user, message = parse_user_row(row)
+                if not parsed_user:
+                    invalid_rows.append({"row": index, "message": message})
+                    continue
+                yield parsed_user
+
+        imported_ids, skipped_names = self.user_repository.import_users(valid_users(), batch_size=batch_size)
+
+        data = {
+            "imported": len(imported_ids),
+            "skipped": skipped_names,
+            "invalid": invalid_rows
+        }
+        return Response(success=True, data=data)
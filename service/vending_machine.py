@@ -1,14 +1,16 @@
 from typing import Tuple
 
 from service.base_service_response import ServiceResponse as Response
+from src.base.money import Cents, COINS
+from src.base.unit_of_work import UnitOfWork
 from src.user.user import User
 from src.user.user_repository import UserRepository
-from src.vending_machine.vending_machine import VendingMachine
+from src.vending_machine.vending_machine import VendingMachine, VendingMachineException
 from src.vending_machine.vending_machine_repository import VendingMachineRepository
 
 
-def validate_deposit(deposit: float) -> Tuple[bool, str]:
-    if deposit % 5 != 0 or deposit not in [5, 10, 20, 50, 100]:
+def validate_deposit(deposit: Cents) -> Tuple[bool, str]:
+    if type(deposit) != int or deposit not in COINS:
         return False, "Invalid Deposit {0}, deposit must be in these values [5 ,10, 20, 50, 100]".format(
             str(deposit))
 
@@ -20,13 +22,17 @@ class VendingMachineService:
         self.user_repository = user_repository
         self.vending_machine_repository = vending_machine_repository
 
-    def add_user_deposit(self, user: User, deposit: float) -> Response:
+    def add_user_deposit(self, user: User, deposit: Cents) -> Response:
         valid, message = validate_deposit(deposit=deposit)
         if not valid:
             return Response(success=False, message=message)
 
-        user.deposit += deposit
-        self.user_repository.insert(user)
+        new_deposit = self.user_repository.add_deposit(user_id=user.id, amount=deposit)
+        if new_deposit is None:
+            return Response(success=False, message="User {0} not found".format(user.id))
+
+        user.deposit = new_deposit
+        user.mark_clean()
 
         data = {
             "user": user
@@ -55,12 +61,26 @@ class VendingMachineService:
             return Response(success=False, message="Qty {0} is more than the available amount {1}".format(str(qty),
                                                                                                           str(inventory_line.cost)))
 
-        vending_machine.sell_item(product_id=product_id, qty=qty)
-
-        user.deposit -= total_charges
-
-        self.user_repository.insert(user)
-        self.vending_machine_repository.insert(vending_machine)
+        # The deposit & the stock are updated by conditional UPDATEs in a single transaction, the checks above are
+        # repeated by the database against the current values. Nothing is written on a domain exception.
+        try:
+            with UnitOfWork(self.vending_machine_repository.engine):
+                vending_machine.sell_item(product_id=product_id, qty=qty)
+
+                deposit = self.user_repository.add_deposit(user_id=user.id, amount=-total_charges)
+                if deposit is None:
+                    raise VendingMachineException("No enough deposits '{0}', total charges '{1}'".format(
+                        user.deposit, total_charges))
+
+                if not self.vending_machine_repository.take_stock(inventory_line_id=inventory_line.id, qty=qty):
+                    raise VendingMachineException("product_id {0} has no available amount, requested: {1}".format(
+                        product_id, qty))
+        except VendingMachineException as e:
+            return Response(success=False, message=str(e))
+
+        user.deposit = deposit
+        user.mark_clean()
+        vending_machine.mark_clean()
 
         # TODO: factorize the change amount into the available currency base amounts.
         data = {
@@ -1,5 +1,5 @@
 from sqlalchemy_utils import create_database
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, text, Integer, Float
 
 from src import Base
 from src.user.db_user import DbUser
@@ -24,5 +24,41 @@ conn = engine.connect()
 
 Base.metadata.create_all(engine)
 
+# create_all skips tables that exist before, add their missing columns & indexes.
+for table in Base.metadata.sorted_tables:
+    existing_columns = [it["name"] for it in inspect(engine).get_columns(table.name)]
+    for column in table.columns:
+        if column.name not in existing_columns:
+            column_type = column.type.compile(dialect=engine.dialect)
+            default = column.server_default is not None and " DEFAULT {0}".format(column.server_default.arg) or ""
+            with engine.begin() as connection:
+                connection.execute(text('ALTER TABLE "{0}" ADD COLUMN "{1}" {2}{3}'.format(table.name, column.name,
+                                                                                        column_type, default)))
+
+    for index in table.indexes:
+        index.create(bind=engine, checkfirst=True)
+
+# Money & stock columns moved from Float to Integer, the amounts were already cents (the coins are 5 to 100 cents) so the
+# stored values are only rounded. The column is rebuilt as SQLite can't alter a column type.
+for table in Base.metadata.sorted_tables:
+    existing_types = {it["name"]: it["type"] for it in inspect(engine).get_columns(table.name)}
+    for column in table.columns:
+        if not isinstance(column.type, Integer) or not isinstance(existing_types.get(column.name), Float):
+            continue
+
+        tmp_name = "{0}_cents".format(column.name)
+        default = column.default is not None and column.default.is_scalar and column.default.arg or 0
+        value = column.nullable and 'ROUND("{0}")' or 'COALESCE(ROUND("{0}"), {1})'
+        with engine.begin() as connection:
+            connection.execute(text('ALTER TABLE "{0}" ADD COLUMN "{1}" {2}{3} DEFAULT {4}'.format(
+                table.name, tmp_name, column.type.compile(dialect=engine.dialect),
+                not column.nullable and " NOT NULL" or "", default)))
+            connection.execute(text('UPDATE "{0}" SET "{1}" = CAST({2} AS INTEGER)'.format(
+                table.name, tmp_name, value.format(column.name, default))))
+            connection.execute(text('ALTER TABLE "{0}" DROP COLUMN "{1}"'.format(table.name, column.name)))
+            connection.execute(text('ALTER TABLE "{0}" RENAME COLUMN "{1}" TO "{2}"'.format(table.name, tmp_name,
+                                                                                         column.name)))
+
 user_repository = get_user_repository(engine)
+user_repository.sync_roles_mask()
 user_repository.create_or_update_admin(password=admin_password)
@@ -0,0 +1,44 @@
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from src.base.domain import Domain
+
+
+class BatchLoader:
+    # Coalesces lookups by id, the queued ids are fetched together by the next get with a single load_many call
+    # (e.g. Repository.get_by_ids). Results, missing ids included, are cached for the loader lifetime so it's meant to
+    # be created per request.
+    def __init__(self, load_many: Callable[[List[str]], Tuple[List[Domain], List[str]]]):
+        self.load_many = load_many
+        self._queue: Dict[str, None] = {}
+        self._cache: Dict[str, Optional[Domain]] = {}
+
+    def queue(self, ids: Iterable[str]) -> None:
+        for it in ids:
+            if it not in self._cache:
+                self._queue[it] = None
+
+    def get(self, _id: str) -> Optional[Domain]:
+        return self.get_many([_id])[0]
+
+    def get_many(self, ids: Iterable[str]) -> List[Optional[Domain]]:
+        ids = list(ids)
+        self.queue(ids)
+        self.dispatch()
+        return [self._cache[it] for it in ids]
+
+    def dispatch(self) -> None:
+        if not self._queue:
+            return
+
+        ids = list(self._queue)
+        self._queue.clear()
+
+        found, missing = self.load_many(ids)
+        for it in found:
+            self._cache[it.id] = it
+        for it in missing:
+            self._cache[it] = None
+
+    def clear(self) -> None:
+        self._queue.clear()
+        self._cache.clear()
@@ -0,0 +1,131 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Set, Tuple
+
+
+# Thread safe bounded cache, entries are evicted by least recent use once max_size is reached and expire after ttl
+# seconds. Entries can be tagged so that every entry derived from the same record is invalidated at once.
+# Every tag invalidation bumps the tag generation, a value loaded while the tag was invalidated is refused by set when
+# given the generation read before the load.
+class LruTtlCache:
+    def __init__(self, max_size: int = 1024, ttl: float = 300.0, clock: Callable[[], float] = time.monotonic):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.clock = clock
+
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, Tuple[float, Optional[Hashable], Any]]" = OrderedDict()
+        self._tags: Dict[Hashable, Set[Hashable]] = {}
+        # Latest invalidation number per tag, bounded by max_size. Tags dropped from it fall back to the floor, the
+        # highest dropped number, so a load which started before the drop is still refused.
+        self._generations: "OrderedDict[Hashable, int]" = OrderedDict()
+        self._invalidation_number = 0
+        self._generation_floor = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def configure(self, max_size: Optional[int] = None, ttl: Optional[float] = None) -> None:
+        with self._lock:
+            if max_size is not None:
+                self.max_size = max_size
+            if ttl is not None:
+                self.ttl = ttl
+            self._evict_overflow()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires_at, tag, value = entry
+            if expires_at <= self.clock():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def generation(self, tag: Hashable) -> int:
+        with self._lock:
+            return self._generations.get(tag, self._generation_floor)
+
+    def set(self, key: Hashable, value: Any, tag: Optional[Hashable] = None, generation: Optional[int] = None) -> None:
+        # generation is the tag generation read before loading the value, the value is dropped when the tag was
+        # invalidated since.
+        if self.max_size <= 0:
+            return
+
+        with self._lock:
+            if generation is not None and self._generations.get(tag, self._generation_floor) != generation:
+                return
+
+            if key in self._entries:
+                self._remove(key)
+
+            self._entries[key] = (self.clock() + self.ttl, tag, value)
+            if tag is not None:
+                self._tags.setdefault(tag, set()).add(key)
+
+            self._evict_overflow()
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+                self.invalidations += 1
+
+    def invalidate_tag(self, tag: Hashable) -> None:
+        with self._lock:
+            self._invalidation_number += 1
+            self._generations.pop(tag, None)
+            self._generations[tag] = self._invalidation_number
+            while len(self._generations) > max(self.max_size, 1):
+                _, self._generation_floor = self._generations.popitem(last=False)
+
+            for key in self._tags.pop(tag, set()):
+                if key in self._entries:
+                    del self._entries[key]
+                    self.invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations
+            }
+
+    def _evict_overflow(self) -> None:
+        while len(self._entries) > max(self.max_size, 0):
+            key = next(iter(self._entries))
+            self._remove(key)
+            self.evictions += 1
+
+    def _remove(self, key: Hashable) -> None:
+        _, tag, _ = self._entries.pop(key)
+        if tag is not None:
+            tagged_keys = self._tags.get(tag)
+            if tagged_keys is not None:
+                tagged_keys.discard(key)
+                if not tagged_keys:
+                    del self._tags[tag]
@@ -1,4 +1,4 @@
-from typing import Dict, List
+from typing import Dict, List, Iterable
 
 from sqlalchemy import Column, TEXT
 
@@ -9,10 +9,13 @@ class DbModel:
     __table_args__ = {'extend_existing': True}
     id = Column(TEXT, primary_key=True)
 
-    def to_dict(self) -> Dict:
+    def to_dict(self, skip_relations: Iterable[str] = ()) -> Dict:
         _db_model_attributes: List[str] = self._get_db_model_attributes()
         res = {}
         for attr in _db_model_attributes:
+            if attr in skip_relations:
+                continue
+
             _value = getattr(self, attr)
             if issubclass(type(_value), Base):
                 # Skip relational objects.
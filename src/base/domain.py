@@ -1,11 +1,40 @@
-from dataclasses import dataclass, field
+from dataclasses import dataclass, field, fields
 import uuid
-from typing import Type, Dict
+from typing import Type, Dict, Set, List, Optional, Any, Tuple, ClassVar
 
 
-@dataclass
+def domain_dataclass(cls: Type = None, *, extra_slots: Tuple[str, ...] = ()) -> Type:
+    # A dataclass with __slots__ instead of a per instance __dict__, dataclass(slots=True) needs python 3.10.
+    # The class is rebuilt with a slot per field it declares, besides the fields the base classes already hold, & its
+    # child collections registry & snapshot fields are resolved from the fields metadata once.
+    def wrap(cls: Type) -> Type:
+        cls = dataclass(cls)
+
+        inherited_slots = {slot for base in cls.__mro__[1:] for slot in getattr(base, "__slots__", ())}
+        slots = tuple(it.name for it in fields(cls) if it.name not in inherited_slots) + tuple(extra_slots)
+
+        cls_dict = dict(cls.__dict__)
+        for name in slots + ("__dict__", "__weakref__"):
+            # Field defaults are already bound to __init__.
+            cls_dict.pop(name, None)
+        cls_dict["__slots__"] = slots
+        cls_dict["_list_of_map"] = {it.name: it.metadata["list_of_type"] for it in fields(cls)
+                                    if "list_of_type" in it.metadata}
+        cls_dict["_value_fields"] = tuple(it.name for it in fields(cls) if "list_of_type" not in it.metadata)
+
+        slotted_cls = type(cls)(cls.__name__, cls.__bases__, cls_dict)
+        slotted_cls.__qualname__ = cls.__qualname__
+        return slotted_cls
+
+    return wrap if cls is None else wrap(cls)
+
+
+@domain_dataclass(extra_slots=("_unloaded_children", "_loaded_values", "_loaded_children"))
 class Domain:
-    _list_of_map = {}
+    # Child collection field name to the domain class of its items, resolved per class by domain_dataclass.
+    _list_of_map: ClassVar[Dict[str, Type["Domain"]]]
+    # Names of the fields which aren't child collections, snapshot by mark_clean.
+    _value_fields: ClassVar[Tuple[str, ...]]
     id: str = field(default=None)
 
     def set_uuid(self):
@@ -13,21 +42,69 @@ class Domain:
             self.id = str(uuid.uuid4())
 
     def to_dict(self):
-        return self.__dict__
+        return {it.name: getattr(self, it.name) for it in fields(self)}
 
     def __post_init__(self):
         if self.id:
             self.id = str(self.id)
 
+        # Child collections which weren't loaded from the database, they are left untouched on write. None until the
+        # first one is marked, as most domain models have none.
+        self._unloaded_children: Optional[Set[str]] = None
+
+        # Fields values & child ids as of the last load or write, None while the domain model isn't persisted or has
+        # no loaded child collection.
+        self._loaded_values: Optional[Dict[str, Any]] = None
+        self._loaded_children: Optional[Dict[str, Set[str]]] = None
+
+    def mark_unloaded(self, key: str) -> None:
+        if self._unloaded_children is None:
+            self._unloaded_children = set()
+        self._unloaded_children.add(key)
+
+    def is_loaded(self, key: str) -> bool:
+        return self._unloaded_children is None or key not in self._unloaded_children
+
+    def mark_clean(self) -> None:
+        # Snapshots the current state, changes are tracked against it until the next write.
+        self._loaded_values = {key: getattr(self, key) for key in self._value_fields}
+        self._loaded_children = None
+
+        for key in self._list_of_map:
+            if not self.is_loaded(key):
+                continue
+
+            children = getattr(self, key) or []
+            if self._loaded_children is None:
+                self._loaded_children = {}
+            self._loaded_children[key] = {it.id for it in children}
+            for it in children:
+                it.mark_clean()
+
+    def is_tracked(self) -> bool:
+        return self._loaded_values is not None
+
+    def get_dirty_fields(self) -> List[str]:
+        return [key for key, value in self._loaded_values.items() if getattr(self, key) != value]
+
+    def get_changed_values(self, values: Dict[str, Any]) -> Dict[str, Any]:
+        # The given values which differ from the snapshot, values without a snapshot count as changed.
+        return {key: value for key, value in values.items()
+                if key not in self._loaded_values or self._loaded_values[key] != value}
+
+    def get_added_children(self, key: str) -> List["Domain"]:
+        loaded_ids = self._loaded_children.get(key, ()) if self._loaded_children else ()
+        return [it for it in getattr(self, key) or [] if it.id not in loaded_ids]
+
+    def get_removed_children(self, key: str) -> List[str]:
+        current_ids = {it.id for it in getattr(self, key) or []}
+        loaded_ids = self._loaded_children.get(key, ()) if self._loaded_children else ()
+        return [it for it in loaded_ids if it not in current_ids]
+
     @classmethod
     def list_of_field(cls, key: str, list_of_type: Type):
-        cls._list_of_map.update({key: list_of_type})
-        return field(default=None)
+        return field(default=None, metadata={"list_of_type": list_of_type})
 
     @classmethod
     def get_list_of_map(cls) -> Dict:
-        res = {}
-        for key, value in cls._list_of_map.items():
-            if key in cls.__dict__:
-                res.update({key: value})
-        return res
+        return cls._list_of_map
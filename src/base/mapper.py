@@ -1,5 +1,5 @@
 from dataclasses import fields, Field
-from typing import Dict, Type, Optional, List, Tuple
+from typing import Dict, Type, Optional, List, Tuple, Hashable
 
 from src.base.db_model import DbModel
 from src.base.domain import Domain
@@ -24,41 +24,96 @@ class TwoWayDict(dict):
         dict.__delitem__(self, key)
 
 
+# data_to_domain plan: the domain class, (data key, child plan or None) per field & the child collections keys.
+DomainPlan = Tuple[Type[Domain], Tuple[Tuple[str, Optional["DomainPlan"]], ...], Tuple[str, ...]]
+# domain_to_data plan: the db model class & (field name, child plan or None) per field.
+DataPlan = Tuple[Type[DbModel], Tuple[Tuple[str, Optional["DataPlan"]], ...]]
+
+
 class Mapper:
     def __init__(self, mapped_entities: List[Tuple]):
         self.mapped_entities_dict = TwoWayDict(mapped_entities=mapped_entities)
 
+        # Plans are compiled once per class pair, so mapping an object doesn't inspect its class again.
+        self._domain_plans: Dict[Hashable, DomainPlan] = {}
+        self._data_plans: Dict[Tuple[Type[Domain], Type[DbModel]], DataPlan] = {}
+
     def data_to_domain(self, data: Dict, domain_class: Type[Domain], manual_mapper: Optional[Dict] = None) -> Domain:
-        manual_mapper = manual_mapper or {}
+        return self._run_domain_plan(self._get_domain_plan(domain_class, manual_mapper), data)
 
-        res = {}
+    def domain_to_data(self, domain_data: Domain, model_class: Type[DbModel]) -> DbModel:
+        return self._run_data_plan(self._get_data_plan(type(domain_data), model_class), domain_data)
+
+    def _get_domain_plan(self, domain_class: Type[Domain], manual_mapper: Optional[Dict] = None) -> DomainPlan:
+        plan_key = (domain_class, tuple(sorted(manual_mapper.items()))) if manual_mapper else domain_class
+        plan = self._domain_plans.get(plan_key)
+        if plan is None:
+            plan = self._domain_plans[plan_key] = self._compile_domain_plan(domain_class, manual_mapper or {})
+        return plan
+
+    def _compile_domain_plan(self, domain_class: Type[Domain], manual_mapper: Dict) -> DomainPlan:
         valid_keys, list_of_map = self._get_domain_class_fields(domain_class=domain_class)
 
+        keys = []
         for key in valid_keys:
             key = key in manual_mapper and manual_mapper[key] or key
+            child_plan = self._get_domain_plan(list_of_map[key]) if key in list_of_map else None
+            keys.append((key, child_plan))
+
+        return domain_class, tuple(keys), tuple(list_of_map)
+
+    def _run_domain_plan(self, plan: DomainPlan, data: Dict) -> Domain:
+        domain_class, keys, list_keys = plan
+
+        res = {}
+        for key, child_plan in keys:
             if key in data:
-                if issubclass(type(data[key]), list) and key in list_of_map:
-                    _list_of_type = list_of_map[key]
-                    res.update({key: [self.data_to_domain(it, _list_of_type) for it in data[key]]})
-                else:
-                    res.update({key: data[key]})
+                value = data[key]
+                if child_plan is not None and isinstance(value, list):
+                    value = [self._run_domain_plan(child_plan, it) for it in value]
+                res[key] = value
 
-        return domain_class(**res)
+        domain = domain_class(**res)
+        for key in list_keys:
+            if key not in data:
+                domain.mark_unloaded(key)
+
+        return domain
+
+    def _get_data_plan(self, domain_class: Type[Domain], model_class: Type[DbModel]) -> DataPlan:
+        plan = self._data_plans.get((domain_class, model_class))
+        if plan is None:
+            plan = self._data_plans[(domain_class, model_class)] = self._compile_data_plan(domain_class, model_class)
+        return plan
+
+    def _compile_data_plan(self, domain_class: Type[Domain], model_class: Type[DbModel]) -> DataPlan:
+        valid_keys, list_of_map = self._get_domain_class_fields(domain_class=domain_class)
+
+        keys = []
+        for key in valid_keys:
+            child_plan = None
+            if key in list_of_map:
+                # support one to many mapping
+                _domain_list_of_type = list_of_map[key]
+                _db_mapped_type: Type = self.mapped_entities_dict[_domain_list_of_type]
+                child_plan = self._get_data_plan(_domain_list_of_type, _db_mapped_type)
+            keys.append((key, child_plan))
+
+        return model_class, tuple(keys)
+
+    def _run_data_plan(self, plan: DataPlan, domain_data: Domain) -> DbModel:
+        model_class, keys = plan
+        unloaded_children = domain_data._unloaded_children or ()
 
-    def domain_to_data(self, domain_data: Domain, model_class: Type[DbModel]) -> DbModel:
         res = {}
-        domain_data_dict = domain_data.__dict__
-        domain_class_fields, domain_list_of_map = self._get_domain_class_fields(domain_class=type(domain_data))
-
-        for key, value in domain_data_dict.items():
-            if key in domain_class_fields:
-                if key in domain_list_of_map and issubclass(type(value), list):
-                    # support one to many mapping
-                    _domain_list_of_type = domain_list_of_map[key]
-                    _db_mapped_type: Type = self.mapped_entities_dict[_domain_list_of_type]
-                    res.update({key: [self.domain_to_data(it, _db_mapped_type) for it in value]})
-                else:
-                    res.update({key: value})
+        for key, child_plan in keys:
+            if key in unloaded_children:
+                continue
+
+            value = getattr(domain_data, key)
+            if child_plan is not None and isinstance(value, list):
+                value = [self._run_data_plan(child_plan, it) for it in value]
+            res[key] = value
 
         return model_class(**res)
 
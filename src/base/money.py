@@ -0,0 +1,25 @@
+from decimal import Decimal, InvalidOperation
+from typing import NewType, Union
+
+# Money amounts are integer cents in the domain, the database & the API, so balances & charges are exact and can be
+# computed by the database.
+Cents = NewType("Cents", int)
+
+# Coins the vending machine accepts.
+COINS = (5, 10, 20, 50, 100)
+
+
+def parse_cents(value: Union[int, float, str]) -> Cents:
+    # Accepts integral amounts only, 10, 10.0 & "10" are 10 cents while 10.5 is rejected with a ValueError.
+    if isinstance(value, bool):
+        raise ValueError("Invalid amount {0}".format(value))
+
+    try:
+        amount = Decimal(str(value).strip())
+    except InvalidOperation as e:
+        raise ValueError("Invalid amount {0}".format(value))
+
+    if not amount.is_finite() or amount != amount.to_integral_value():
+        raise ValueError("Invalid amount {0}, amounts are integer cents".format(value))
+
+    return Cents(int(amount))
@@ -1,25 +1,131 @@
-from typing import Optional, Type, List, Dict, Union
+from contextlib import contextmanager
+from dataclasses import fields
+from itertools import islice
+from typing import Optional, Type, List, Dict, Union, Iterable, Iterator, Callable, Tuple
 
-from sqlalchemy import select, update
+from sqlalchemy import select, update, delete, insert, inspect, bindparam
+from sqlalchemy.dialects import sqlite, postgresql
 from sqlalchemy.exc import NoResultFound
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, noload, raiseload, selectinload, subqueryload, lazyload
+from sqlalchemy.sql import Select
 
 from src.base.db_model import DbModel
 from src.base.domain import Domain
 from src.base.mapper import Mapper
+from src.base.unit_of_work import get_unit_of_work
+
+
+def chunked(iterable: Iterable, size: int) -> Iterator[List]:
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+# Dialects with a native INSERT ... ON CONFLICT DO UPDATE, others fall back to a session merge.
+UPSERT_INSERTS = {
+    "sqlite": sqlite.insert,
+    "postgresql": postgresql.insert,
+}
+
+# Loader strategies which leave the relationship out of the domain model, it's marked as not loaded so writing the
+# domain model back leaves the child records untouched.
+SKIPPED_LOADERS = (noload, raiseload)
+
+# Loader strategies the direct row hydration can stand in for, it loads the child rows with an IN query per batch of
+# parents the same way selectinload does. Other strategies, like joinedload or loader options with extra criteria, go
+# through the ORM.
+ROW_LOADERS = (selectinload, subqueryload, lazyload)
+
+# Direct row hydration plan: the domain class, the columns selected in the domain fields order & per child collection
+# (key, child plan, parent column index, child foreign key column, child foreign key index).
+RowPlan = Tuple[Type[Domain], Tuple, Tuple[Tuple[str, "RowPlan", int, object, int], ...]]
+
+# Compiled once per (domain class, db model) pair, None when the domain class can't be hydrated from rows.
+_row_plans: Dict[Tuple[Type[Domain], Type[DbModel]], Optional[RowPlan]] = {}
+
+# Hot lookup statements built once per repository class & loader strategies, their values are bound as parameters at
+# execution so SQLAlchemy reuses the statement's memoized cache key & its compiled form instead of rebuilding both per
+# call.
+_statements_cache: Dict[Tuple, object] = {}
 
 
 class Repository:
+    # Relationship name to its default loader strategy (selectinload, joinedload, noload...), relationships which aren't
+    # listed are lazy loaded. Read methods take a load dict overriding them per call.
+    loader_strategies: Dict[str, Callable] = {}
+
+    # Reads select plain rows & build the domain models straight from them, skipping the ORM instances, to_dict & the
+    # mapper. Repositories whose domain models don't fit it are read through the ORM whatever the flag is.
+    hydrate_rows: bool = True
+
     def __init__(self, engine, mapper: Mapper, db_model_type: Type[DbModel], domain_model_type: Type[Domain]):
         self.engine = engine
         self.mapper = mapper
         self.db_model_type = db_model_type
         self.domain_model_type = domain_model_type
 
-    def insert(self, domain_model: Domain) -> Domain:
+    def insert(self, domain_model: Domain, refresh: bool = True) -> Domain:
+        # Inserts or updates the record & its loaded child records, when refresh is False the caller's domain model is
+        # returned as is instead of reading the written record back.
+        # Domain models loaded through the repository only write the columns & child records changed since the load.
         self._set_uuid_if_missing(domain_model)
 
-        with Session(self.engine) as session:
+        upsert_insert = UPSERT_INSERTS.get(self.engine.dialect.name)
+        if not upsert_insert and not domain_model.is_tracked():
+            return self._merge(domain_model)
+
+        with self._session() as session:
+            db_model = self.mapper.domain_to_data(domain_model, self.db_model_type)
+            if not domain_model.is_tracked() or \
+                    not self._write_changes(session, domain_model=domain_model, db_model=db_model,
+                                            upsert_insert=upsert_insert):
+                self._write(session, db_models=[db_model], upsert_insert=upsert_insert)
+            self._commit(session)
+            domain_model.mark_clean()
+
+            if not refresh:
+                return domain_model
+
+            db_model = self._get_by_id(session=session, _id=db_model.id)
+            return self._to_domain(db_model)
+
+    def insert_many(self, domain_models: Iterable[Domain], batch_size: int = 500) -> List[str]:
+        # New records only, a single transaction written in batches of batch_size records, a duplicated id rolls back
+        # the whole transaction. Returns the written ids.
+        return self._write_many(domain_models, batch_size=batch_size, upsert=False)
+
+    def upsert_many(self, domain_models: Iterable[Domain], batch_size: int = 500) -> List[str]:
+        # Same as insert_many, existing records are updated the same way insert does.
+        return self._write_many(domain_models, batch_size=batch_size, upsert=True)
+
+    def _write_many(self, domain_models: Iterable[Domain], batch_size: int, upsert: bool) -> List[str]:
+        upsert_insert = UPSERT_INSERTS.get(self.engine.dialect.name) if upsert else None
+
+        ids = []
+        with self._session() as session:
+            for batch in chunked(domain_models, batch_size):
+                db_models = []
+                for domain_model in batch:
+                    self._set_uuid_if_missing(domain_model)
+                    db_models.append(self.mapper.domain_to_data(domain_model, self.db_model_type))
+                    ids.append(domain_model.id)
+
+                if upsert and upsert_insert is None:
+                    for db_model in db_models:
+                        session.merge(db_model)
+                    session.flush()
+                else:
+                    self._write(session, db_models=db_models, upsert_insert=upsert_insert)
+
+            self._commit(session)
+
+        return ids
+
+    def _merge(self, domain_model: Domain) -> Domain:
+        with self._session() as session:
             db_model = self.mapper.domain_to_data(domain_model, self.db_model_type)
 
             stmt_res = self._get_by_id(session=session, _id=db_model.id)
@@ -27,39 +133,257 @@ class Repository:
             if not stmt_res:
                 # Insert new record
                 session.add(db_model)
-                session.commit()
+                self._commit(session)
                 session.refresh(db_model)
-                return self.mapper.data_to_domain(db_model.to_dict(), self.domain_model_type)
+                return self._to_domain(db_model)
             else:
                 # Update Existing record
                 self._update_db_with_new_values(session, new_db_model=stmt_res, old_db_model=db_model)
-                session.commit()
+                self._commit(session)
                 session.refresh(stmt_res)
-                return self.mapper.data_to_domain(stmt_res.to_dict(), self.domain_model_type)
+                return self._to_domain(stmt_res)
 
-    def get_all(self) -> List[Domain]:
-        with Session(self.engine) as session:
-            stmt = select(self.db_model_type)
-            db_model_list: List[DbModel] = session.scalars(stmt).all()
-            return [self.mapper.data_to_domain(it.to_dict(), self.domain_model_type) for it in db_model_list]
+    def get_all(self, load: Optional[Dict[str, Callable]] = None) -> List[Domain]:
+        stmt, skip_relations, row_plan = self._select_for_read(load=load)
+        with self._session() as session:
+            return self._read(session, stmt, skip_relations=skip_relations, row_plan=row_plan)
 
-    def get_by_id(self, _id: str) -> Optional[Domain]:
-        with Session(self.engine) as session:
-            db_model: Optional[DbModel] = self._get_by_id(session=session, _id=_id)
-            if db_model:
-                return self.mapper.data_to_domain(db_model.to_dict(), self.domain_model_type)
+    def get_page(self, limit: int, after: Optional[str] = None,
+                 load: Optional[Dict[str, Callable]] = None) -> List[Domain]:
+        # Keyset pagination on the primary key, after is the last id of the previous page.
+        stmt, skip_relations, row_plan = self._select_for_read(load=load)
+        stmt = stmt.order_by(self.db_model_type.id).limit(limit)
+        if after is not None:
+            stmt = stmt.where(self.db_model_type.id > after)
 
+        with self._session() as session:
+            return self._read(session, stmt, skip_relations=skip_relations, row_plan=row_plan)
+
+    def iter_all(self, batch_size: int = 500, load: Optional[Dict[str, Callable]] = None) -> Iterator[Domain]:
+        # Streams the records with a server side cursor, batch_size rows are held in memory at a time. Collections
+        # can't be joinedload-ed while streaming, selectinload loads them once per batch.
+        stmt, skip_relations, row_plan = self._select_for_read(load=load)
+        stmt = stmt.order_by(self.db_model_type.id).execution_options(yield_per=batch_size)
+
+        with self._session() as session:
+            if row_plan:
+                for rows in session.execute(stmt).partitions():
+                    yield from self._rows_to_domain(session, row_plan, rows, skip_relations=skip_relations)
+                return
+
+            for db_model in session.scalars(stmt):
+                yield self._to_domain(db_model, skip_relations=skip_relations)
+
+    def get_by_id(self, _id: str, load: Optional[Dict[str, Callable]] = None) -> Optional[Domain]:
+        if load is None:
+            stmt, skip_relations, row_plan = self._cached_statement("get_by_id",
+                                                                  lambda: self._select_for_read_where_id())
+        else:
+            stmt, skip_relations, row_plan = self._select_for_read_where_id(load=load)
+
+        with self._session() as session:
+            res = self._read(session, stmt, params={"id": _id}, skip_relations=skip_relations, row_plan=row_plan)
+            return res[0] if res else None
+
+    def get_by_ids(self, ids: Iterable[str], batch_size: int = 500,
+                   load: Optional[Dict[str, Callable]] = None) -> Tuple[List[Domain], List[str]]:
+        # A single session & an IN query per batch_size ids. Returns the found domain models in the ids order &
+        # the missing ids, duplicated ids are looked up once.
+        ids = list(dict.fromkeys(ids))
+        stmt, skip_relations, row_plan = self._select_for_read(load=load)
+
+        found: Dict[str, Domain] = {}
+        with self._session() as session:
+            for batch in chunked(ids, batch_size):
+                for it in self._read(session, stmt.where(self.db_model_type.id.in_(batch)),
+                                     skip_relations=skip_relations, row_plan=row_plan):
+                    found[it.id] = it
+
+        return [found[it] for it in ids if it in found], [it for it in ids if it not in found]
+
+    def _select(self, load: Optional[Dict[str, Callable]] = None) -> Tuple[Select, List[str]]:
+        # Returns the select with the loader options & the relationships left out of the domain model.
+        strategies = {**self.loader_strategies, **(load or {})}
+
+        stmt = select(self.db_model_type).options(
+            *[strategy(getattr(self.db_model_type, key)) for key, strategy in strategies.items()])
+        skip_relations = [key for key, strategy in strategies.items() if strategy in SKIPPED_LOADERS]
+
+        return stmt, skip_relations
+
+    def _select_where_id(self, load: Optional[Dict[str, Callable]] = None) -> Tuple[Select, List[str]]:
+        stmt, skip_relations = self._select(load=load)
+        return stmt.where(self.db_model_type.id == bindparam("id")), skip_relations
+
+    def _select_for_read(self, load: Optional[Dict[str, Callable]] = None) -> Tuple[Select, List[str], bool]:
+        # The select of the domain columns when the rows can be hydrated directly, the ORM select otherwise. Returns
+        # the select, the relationships left out of the domain model & the row plan, None for the ORM select.
+        row_plan = self._get_row_plan(load=load)
+        if row_plan is None:
+            stmt, skip_relations = self._select(load=load)
+            return stmt, skip_relations, None
+
+        strategies = {**self.loader_strategies, **(load or {})}
+        skip_relations = [key for key, strategy in strategies.items() if strategy in SKIPPED_LOADERS]
+        return select(*row_plan[1]), skip_relations, row_plan
+
+    def _select_for_read_where_id(self, load: Optional[Dict[str, Callable]] = None) -> Tuple[Select, List[str], bool]:
+        stmt, skip_relations, row_plan = self._select_for_read(load=load)
+        return stmt.where(self.db_model_type.id == bindparam("id")), skip_relations, row_plan
+
+    def _read(self, session, stmt: Select, skip_relations: List[str], row_plan: Optional[RowPlan],
+              params: Optional[Dict] = None) -> List[Domain]:
+        if row_plan:
+            return self._rows_to_domain(session, row_plan, session.execute(stmt, params).all(),
+                                        skip_relations=skip_relations)
+
+        db_model_list: List[DbModel] = session.scalars(stmt, params).unique().all()
+        return [self._to_domain(it, skip_relations=skip_relations) for it in db_model_list]
+
+    def _get_row_plan(self, load: Optional[Dict[str, Callable]] = None) -> Optional[RowPlan]:
+        if not self.hydrate_rows:
+            return None
+
+        strategies = {**self.loader_strategies, **(load or {})}
+        if any(it not in ROW_LOADERS and it not in SKIPPED_LOADERS for it in strategies.values()):
             return None
 
+        return self._compile_row_plan(self.domain_model_type, self.db_model_type)
+
+    def _compile_row_plan(self, domain_class: Type[Domain], db_model_type: Type[DbModel]) -> Optional[RowPlan]:
+        # The columns are passed to the domain class positionally, so its fields must be db model columns followed by
+        # the child collections, each one mapped to a one to many relationship on a single foreign key.
+        plan_key = (domain_class, db_model_type)
+        if plan_key in _row_plans:
+            return _row_plans[plan_key]
+
+        plan = None
+        list_of_map = domain_class.get_list_of_map()
+        keys = [it.name for it in fields(domain_class)]
+        column_keys = [it for it in keys if it not in list_of_map]
+        db_mapper = inspect(db_model_type)
+
+        if keys[:len(column_keys)] == column_keys and all(it in db_mapper.column_attrs for it in column_keys):
+            children = []
+            for key, child_domain_class in list_of_map.items():
+                relationship = db_mapper.relationships.get(key)
+                if relationship is None or len(relationship.local_remote_pairs) != 1:
+                    break
+
+                child_db_model_type = relationship.mapper.class_
+                local_column, remote_column = relationship.local_remote_pairs[0]
+                child_plan = self._compile_row_plan(child_domain_class, child_db_model_type)
+                if child_plan is None or local_column.key not in column_keys or \
+                        self.mapper.mapped_entities_dict.get(child_domain_class) is not child_db_model_type:
+                    break
+
+                child_column_keys = [it.key for it in child_plan[1]]
+                if remote_column.key not in child_column_keys:
+                    break
+
+                children.append((key, child_plan, column_keys.index(local_column.key),
+                                 getattr(child_db_model_type, remote_column.key),
+                                 child_column_keys.index(remote_column.key)))
+            else:
+                plan = domain_class, tuple(getattr(db_model_type, it) for it in column_keys), tuple(children)
+
+        _row_plans[plan_key] = plan
+        return plan
+
+    def _rows_to_domain(self, session, row_plan: RowPlan, rows: List,
+                        skip_relations: Iterable[str] = ()) -> List[Domain]:
+        domain_models = self._hydrate(session, row_plan, rows, skip_relations=skip_relations)
+        for it in domain_models:
+            it.mark_clean()
+        return domain_models
+
+    def _hydrate(self, session, plan: RowPlan, rows: List, skip_relations: Iterable[str] = ()) -> List[Domain]:
+        # Builds the domain models in the rows order, the child rows of all of them are selected at once per batch.
+        domain_class, _, children = plan
+
+        loaded_children, unloaded_keys = [], []
+        for key, child_plan, parent_index, foreign_key_column, foreign_key_index in children:
+            if key in skip_relations:
+                unloaded_keys.append(key)
+                continue
+
+            children_by_parent: Dict[object, List[Domain]] = {}
+            parent_keys = list(dict.fromkeys(row[parent_index] for row in rows))
+            for batch in chunked(parent_keys, 500):
+                child_rows = session.execute(select(*child_plan[1]).where(foreign_key_column.in_(batch))).all()
+                for child_row, child in zip(child_rows, self._hydrate(session, child_plan, child_rows)):
+                    children_by_parent.setdefault(child_row[foreign_key_index], []).append(child)
+
+            loaded_children.append((key, parent_index, children_by_parent))
+
+        res = []
+        for row in rows:
+            if loaded_children:
+                domain_model = domain_class(*row, **{key: children_by_parent.get(row[parent_index], [])
+                                                     for key, parent_index, children_by_parent in loaded_children})
+            else:
+                domain_model = domain_class(*row)
+
+            for key in unloaded_keys:
+                domain_model.mark_unloaded(key)
+            res.append(domain_model)
+
+        return res
+
+    def _cached_statement(self, name: str, build: Callable):
+        key = self._statement_key(name)
+        stmt = _statements_cache.get(key)
+        if stmt is None:
+            stmt = _statements_cache[key] = build()
+
+        return stmt
+
+    def _statement_key(self, name: str) -> Tuple:
+        # Everything the cached statements are built from besides the repository class, loader_strategies &
+        # hydrate_rows can be overridden per instance.
+        return type(self), name, tuple(self.loader_strategies.items()), self.hydrate_rows
+
+    def _to_domain(self, db_model: DbModel, skip_relations: Iterable[str] = ()) -> Domain:
+        domain_model = self.mapper.data_to_domain(db_model.to_dict(skip_relations=skip_relations),
+                                                  self.domain_model_type)
+        domain_model.mark_clean()
+        return domain_model
+
     def _get_by_id(self, session, _id: str) -> Optional[DbModel]:
-        stmt = select(self.db_model_type).where(self.db_model_type.id == _id)
+        stmt = self._cached_statement(
+            "_get_by_id", lambda: select(self.db_model_type).where(self.db_model_type.id == bindparam("id")))
         try:
-            stmt_res = session.scalars(stmt).one()
+            stmt_res = session.scalars(stmt, {"id": _id}).one()
         except NoResultFound as e:
             stmt_res = None
 
         return stmt_res
 
+    @contextmanager
+    def _session(self) -> Iterator[Session]:
+        # The session of the unit of work the repository is enlisted in, otherwise a session of its own.
+        unit_of_work = get_unit_of_work(self.engine)
+        if unit_of_work:
+            yield unit_of_work.session
+        else:
+            with Session(self.engine) as session:
+                yield session
+
+    def _commit(self, session) -> None:
+        # Inside a unit of work the changes are only flushed, it commits all of them at once.
+        if get_unit_of_work(self.engine):
+            session.flush()
+        else:
+            session.commit()
+
+    def _after_commit(self, callback: Callable[[], None]) -> None:
+        # Inside a unit of work the callback waits for its commit, otherwise the changes are already committed.
+        unit_of_work = get_unit_of_work(self.engine)
+        if unit_of_work:
+            unit_of_work.after_commit(callback)
+        else:
+            callback()
+
     def _set_uuid_if_missing(self, domain_model: Domain) -> None:
         domain_model.set_uuid()
 
@@ -70,3 +394,110 @@ class Repository:
 
     def _update_db_with_new_values(self, session, new_db_model: DbModel, old_db_model: DbModel) -> None:
         new_db_model = session.merge(old_db_model)
+
+    def _write_changes(self, session, domain_model: Domain, db_model: DbModel, upsert_insert=None) -> bool:
+        # UPDATEs only the columns changed since the domain model was loaded, inserts the added child records, deletes
+        # the removed ones & recurses into the tracked ones. Returns False when the record doesn't exist anymore.
+        table = type(db_model).__table__
+        values = domain_model.get_changed_values(self._get_row(db_model))
+        values.pop("id", None)
+        if values:
+            res = session.execute(update(table).where(table.c.id == domain_model.id).values(**values))
+            if res.rowcount == 0:
+                return False
+
+        for relationship in inspect(type(db_model)).relationships:
+            key = relationship.key
+            children = db_model.__dict__.get(key)
+            if not isinstance(children, list):
+                continue
+
+            for child in children:
+                for local_column, remote_column in relationship.local_remote_pairs:
+                    setattr(child, remote_column.key, getattr(db_model, local_column.key))
+
+            removed_ids = domain_model.get_removed_children(key)
+            if removed_ids:
+                child_table = relationship.mapper.class_.__table__
+                session.execute(delete(child_table).where(child_table.c.id.in_(removed_ids)))
+
+            added_ids = {it.id for it in domain_model.get_added_children(key)}
+            added = []
+            for domain_child, db_child in zip(getattr(domain_model, key), children):
+                if domain_child.id in added_ids or not domain_child.is_tracked():
+                    added.append(db_child)
+                elif not self._write_changes(session, domain_model=domain_child, db_model=db_child,
+                                             upsert_insert=upsert_insert):
+                    added.append(db_child)
+
+            self._write(session, db_models=added, upsert_insert=upsert_insert)
+
+        return True
+
+    def _write(self, session, db_models: List[DbModel], upsert_insert=None) -> None:
+        # Writes the records & their loaded child records with an executemany per table, plain inserts when
+        # upsert_insert is None.
+        if not db_models:
+            return
+
+        db_model_type = type(db_models[0])
+        self._write_rows(session, db_model_type=db_model_type, rows=[self._get_row(it) for it in db_models],
+                         upsert_insert=upsert_insert)
+
+        for relationship in inspect(db_model_type).relationships:
+            parents, children = [], []
+            for db_model in db_models:
+                _children = db_model.__dict__.get(relationship.key)
+                if not isinstance(_children, list):
+                    # Not loaded into the domain model, or the many to one side.
+                    continue
+
+                for child in _children:
+                    for local_column, remote_column in relationship.local_remote_pairs:
+                        setattr(child, remote_column.key, getattr(db_model, local_column.key))
+
+                parents.append(db_model)
+                children.extend(_children)
+
+            self._write(session, db_models=children, upsert_insert=upsert_insert)
+
+            if parents and upsert_insert is not None and relationship.cascade.delete_orphan:
+                child_table = relationship.mapper.class_.__table__
+                stmt = delete(child_table).where(child_table.c.id.notin_([it.id for it in children]))
+                for local_column, remote_column in relationship.local_remote_pairs:
+                    stmt = stmt.where(remote_column.in_([getattr(it, local_column.key) for it in parents]))
+                session.execute(stmt)
+
+    def _write_rows(self, session, db_model_type: Type[DbModel], rows: List[Dict], upsert_insert=None) -> None:
+        # A statement per distinct set of columns, rows sharing it are sent as a single executemany.
+        rows_by_columns: Dict[tuple, List[Dict]] = {}
+        for row in rows:
+            rows_by_columns.setdefault(tuple(row), []).append(row)
+
+        table = db_model_type.__table__
+        for columns, columns_rows in rows_by_columns.items():
+            if upsert_insert is None:
+                stmt = insert(table)
+            else:
+                stmt = upsert_insert(table)
+                stmt = stmt.on_conflict_do_update(index_elements=[table.c.id],
+                                                  set_={it: stmt.excluded[it] for it in columns if it != "id"})
+            session.execute(stmt, columns_rows)
+
+    def _get_row(self, db_model: DbModel) -> Dict:
+        # Only the columns set from the domain model, others keep their stored value on update & their default on
+        # insert, the same way the session handles a None value for a column with a default.
+        row = {}
+        for column_property in inspect(type(db_model)).column_attrs:
+            key = column_property.key
+            if key not in db_model.__dict__:
+                continue
+
+            value = db_model.__dict__[key]
+            column = column_property.columns[0]
+            if value is None and (column.default is not None or column.server_default is not None):
+                continue
+
+            row[column.name] = value
+
+        return row
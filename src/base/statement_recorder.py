@@ -0,0 +1,35 @@
+from contextlib import contextmanager
+from typing import Callable, Iterator, List
+
+from sqlalchemy import event
+from sqlalchemy.engine import Connection, Engine
+
+
+@contextmanager
+def record_statements(engine: Engine) -> Iterator[List[str]]:
+    # Collects the SQL of every statement the engine runs within the block, the listener is removed even on failure.
+    statements: List[str] = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with _listening(engine, "before_cursor_execute", record):
+        yield statements
+
+
+@contextmanager
+def record_commits(engine: Engine) -> Iterator[List[Connection]]:
+    # Collects the connection of every transaction the engine commits within the block.
+    commits: List[Connection] = []
+
+    with _listening(engine, "commit", commits.append):
+        yield commits
+
+
+@contextmanager
+def _listening(engine: Engine, identifier: str, listener: Callable) -> Iterator[None]:
+    event.listen(engine, identifier, listener)
+    try:
+        yield
+    finally:
+        event.remove(engine, identifier, listener)
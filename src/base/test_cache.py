@@ -0,0 +1,73 @@
+from unittest import TestCase
+
+from src.base.cache import LruTtlCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestLruTtlCache(TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.cache = LruTtlCache(max_size=2, ttl=10, clock=self.clock)
+
+    def test_hit_and_miss(self):
+        self.cache.set("a", 1)
+
+        self.assertEqual(self.cache.get("a"), 1)
+        self.assertIsNone(self.cache.get("b"))
+        self.assertEqual(self.cache.hits, 1)
+        self.assertEqual(self.cache.misses, 1)
+
+    def test_least_recently_used_is_evicted(self):
+        self.cache.set("a", 1)
+        self.cache.set("b", 2)
+        self.cache.get("a")
+        self.cache.set("c", 3)
+
+        self.assertEqual(self.cache.get("a"), 1)
+        self.assertIsNone(self.cache.get("b"))
+        self.assertEqual(self.cache.get("c"), 3)
+        self.assertEqual(self.cache.evictions, 1)
+
+    def test_entry_expires_after_ttl(self):
+        self.cache.set("a", 1)
+        self.clock.now = 10
+
+        self.assertIsNone(self.cache.get("a"))
+        self.assertEqual(self.cache.expirations, 1)
+        self.assertEqual(self.cache.stats()["size"], 0)
+
+    def test_invalidate_tag(self):
+        self.cache.set("a", 1, tag="user-1")
+        self.cache.set("b", 2, tag="user-2")
+
+        self.cache.invalidate_tag("user-1")
+
+        self.assertIsNone(self.cache.get("a"))
+        self.assertEqual(self.cache.get("b"), 2)
+        self.assertEqual(self.cache.invalidations, 1)
+
+    def test_set_after_tag_invalidation_is_refused(self):
+        generation = self.cache.generation("user-1")
+        # The tag is invalidated while the value is being loaded.
+        self.cache.invalidate_tag("user-1")
+        self.cache.set("a", 1, tag="user-1", generation=generation)
+        self.assertIsNone(self.cache.get("a"))
+
+        self.cache.set("a", 1, tag="user-1", generation=self.cache.generation("user-1"))
+        self.assertEqual(self.cache.get("a"), 1)
+
+    def test_dropped_tag_generations_still_refuse_older_loads(self):
+        generation = self.cache.generation("user-1")
+        self.cache.invalidate_tag("user-1")
+        for it in range(3):
+            self.cache.invalidate_tag("user-{0}".format(it + 2))
+
+        self.cache.set("a", 1, tag="user-1", generation=generation)
+        self.assertIsNone(self.cache.get("a"))
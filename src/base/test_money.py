@@ -0,0 +1,14 @@
+from unittest import TestCase
+
+from src.base.money import parse_cents
+
+
+class TestParseCents(TestCase):
+    def test_parse_cents(self):
+        for value in [10, 10.0, "10", " 10.00 "]:
+            self.assertEqual(parse_cents(value), 10)
+            self.assertEqual(type(parse_cents(value)), int)
+
+        for value in [10.5, "10.5", "ten", "nan", "inf", True]:
+            with self.assertRaises(ValueError):
+                parse_cents(value)
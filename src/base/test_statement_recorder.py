@@ -0,0 +1,37 @@
+from unittest import TestCase
+
+from sqlalchemy import create_engine, text
+
+from src.base.statement_recorder import record_statements, record_commits
+
+
+class TestRecordStatements(TestCase):
+    def setUp(self):
+        self.engine = create_engine("sqlite+pysqlite:///:memory:", future=True)
+
+    def test_records_statements_within_the_block(self):
+        with self.engine.connect() as conn:
+            with record_statements(self.engine) as statements:
+                conn.execute(text("SELECT 1"))
+            conn.execute(text("SELECT 2"))
+
+        self.assertEqual(statements, ["SELECT 1"])
+
+    def test_listener_is_removed_on_failure(self):
+        with self.assertRaises(ValueError):
+            with record_statements(self.engine) as statements:
+                raise ValueError()
+
+        with self.engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+
+        self.assertEqual(statements, [])
+
+    def test_records_commits_within_the_block(self):
+        with self.engine.connect() as conn:
+            with record_commits(self.engine) as commits:
+                conn.execute(text("SELECT 1"))
+                conn.commit()
+            conn.commit()
+
+        self.assertEqual(len(commits), 1)
@@ -0,0 +1,63 @@
+from contextvars import ContextVar
+from typing import Callable, List, Optional
+
+from sqlalchemy.orm import Session
+
+_current_unit_of_work: ContextVar[Optional["UnitOfWork"]] = ContextVar("current_unit_of_work", default=None)
+
+
+def get_unit_of_work(engine) -> Optional["UnitOfWork"]:
+    unit_of_work = _current_unit_of_work.get()
+    if unit_of_work and unit_of_work.engine is engine:
+        return unit_of_work
+
+    return None
+
+
+class UnitOfWork:
+    # Repositories on the same engine enlist in the unit of work opened by the with block, they share its session and
+    # only flush, the unit of work commits once on exit or rolls everything back on any exception.
+    # Nested units of work join the outer one.
+    def __init__(self, engine):
+        self.engine = engine
+        self.session: Optional[Session] = None
+        self._outer: Optional[UnitOfWork] = None
+        self._token = None
+        self._after_commit: List[Callable[[], None]] = []
+
+    def after_commit(self, callback: Callable[[], None]) -> None:
+        # Runs the callback once the changes are committed, it's dropped on rollback.
+        if self._outer:
+            self._outer.after_commit(callback)
+        else:
+            self._after_commit.append(callback)
+
+    def __enter__(self) -> "UnitOfWork":
+        self._outer = get_unit_of_work(self.engine)
+        if self._outer:
+            self.session = self._outer.session
+        else:
+            self.session = Session(self.engine)
+            self._token = _current_unit_of_work.set(self)
+
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        if self._outer:
+            # The outer unit of work commits, or rolls back when the exception reaches it.
+            return
+
+        committed = False
+        try:
+            if exc_type is None:
+                self.session.commit()
+                committed = True
+            else:
+                self.session.rollback()
+        finally:
+            self.session.close()
+            _current_unit_of_work.reset(self._token)
+
+        if committed:
+            for callback in self._after_commit:
+                callback()
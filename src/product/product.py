@@ -1,9 +1,9 @@
-from dataclasses import dataclass, field
+from dataclasses import field
 
-from src.base.domain import Domain
+from src.base.domain import Domain, domain_dataclass
 
 
-@dataclass
+@domain_dataclass
 class Product(Domain):
     name: str = field(default=None)
     country_of_origin: str = field(default=None)
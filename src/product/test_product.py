@@ -3,6 +3,8 @@ from unittest import TestCase
 from sqlalchemy import create_engine
 
 from src import Base
+from src.base.batch_loader import BatchLoader
+from src.base.statement_recorder import record_statements
 from src.product.db_product import DbProduct
 from src.product.mapper import ProductMapper
 from src.product.product import Product
@@ -39,3 +41,85 @@ class TestProductRepository(TestCase):
         self.assertEqual(res.country_of_origin, country_of_origin)
         self.assertEqual(res.calories, calories)
         self.assertEqual(res.flavor, flavor)
+
+    def test_get_page(self):
+        ids = sorted(self.product_repository.insert_many(
+            [Product(name="Product {0}".format(it), country_of_origin="Egypt", calories=90, flavor="Flavor")
+             for it in range(5)]))
+
+        first_page = self.product_repository.get_page(limit=2)
+        second_page = self.product_repository.get_page(limit=2, after=first_page[-1].id)
+        last_page = self.product_repository.get_page(limit=2, after=second_page[-1].id)
+
+        self.assertEqual([it.id for it in first_page + second_page + last_page], ids)
+        self.assertEqual(len(last_page), 1)
+
+    def test_iter_all(self):
+        ids = self.product_repository.insert_many(
+            [Product(name="Product {0}".format(it), country_of_origin="Egypt", calories=90, flavor="Flavor")
+             for it in range(5)])
+
+        res = self.product_repository.iter_all(batch_size=2)
+
+        self.assertEqual([it.id for it in res], sorted(ids))
+
+    def test_orm_fallback_per_instance(self):
+        product = self.product_repository.insert(Product(name="Product 1", country_of_origin="Egypt", calories=90,
+                                                         flavor="Flavor"))
+        self.assertEqual(self.product_repository.get_by_id(product.id), product)
+
+        # A second instance reading through the ORM while the first one's cached statement selects plain rows.
+        product_repository = ProductRepository(engine=self.engine, mapper=self.product_repository.mapper)
+        product_repository.hydrate_rows = False
+        self.assertEqual(product_repository.get_by_id(product.id), product)
+        self.assertEqual(self.product_repository.get_by_id(product.id), product)
+
+    def test_update_writes_changed_columns_only(self):
+        product = self.product_repository.insert(Product(name="Product 1", country_of_origin="Egypt", calories=90,
+                                                         flavor="Flavor 1"))
+        product = self.product_repository.get_by_id(product.id)
+        self.assertEqual(product.get_dirty_fields(), [])
+
+        product.flavor = "Flavor 2"
+        self.assertEqual(product.get_dirty_fields(), ["flavor"])
+
+        with record_statements(self.engine) as statements:
+            self.product_repository.insert(product, refresh=False)
+            self.product_repository.insert(product, refresh=False)
+
+        # The second write has nothing left to write.
+        self.assertEqual(len(statements), 1)
+        self.assertTrue(statements[0].startswith('UPDATE "Product" SET flavor=?'))
+        self.assertEqual(self.product_repository.get_by_id(product.id).flavor, "Flavor 2")
+
+    def test_get_by_ids(self):
+        ids = self.product_repository.insert_many(
+            [Product(name="Product {0}".format(it), country_of_origin="Egypt", calories=90, flavor="Flavor")
+             for it in range(5)])
+
+        with record_statements(self.engine) as statements:
+            found, missing = self.product_repository.get_by_ids([ids[3], "missing-1", ids[0], ids[3], ids[4]],
+                                                                batch_size=2)
+
+        self.assertEqual([it.id for it in found], [ids[3], ids[0], ids[4]])
+        self.assertEqual(missing, ["missing-1"])
+        self.assertEqual(len(statements), 2)
+
+    def test_batch_loader(self):
+        ids = self.product_repository.insert_many(
+            [Product(name="Product {0}".format(it), country_of_origin="Egypt", calories=90, flavor="Flavor")
+             for it in range(3)])
+        calls = []
+
+        def load_many(batch):
+            calls.append(batch)
+            return self.product_repository.get_by_ids(batch)
+
+        loader = BatchLoader(load_many=load_many)
+        loader.queue(ids[:2])
+
+        self.assertEqual(loader.get(ids[2]).id, ids[2])
+        self.assertEqual([it.id for it in loader.get_many(ids)], ids)
+        self.assertIsNone(loader.get("missing-1"))
+        self.assertIsNone(loader.get("missing-1"))
+        self.assertEqual(calls, [[ids[0], ids[1], ids[2]], ["missing-1"]])
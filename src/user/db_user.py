@@ -1,4 +1,4 @@
-from sqlalchemy import Column, TEXT, Float, Boolean
+from sqlalchemy import Column, TEXT, Boolean, Index, Integer
 from sqlalchemy.orm import relationship
 
 from src.base.db_model import DbModel
@@ -7,9 +7,17 @@ from src import Base
 
 class DbUser(DbModel, Base):
     __tablename__ = "User"
+    __table_args__ = (
+        # Covering index for the sign in credentials lookup.
+        Index("ix_User_name_password_id", "name", "password", "id"),
+        DbModel.__table_args__
+    )
 
     name = Column(TEXT, nullable=False, unique=True)
     password = Column(TEXT, nullable=True)
-    deposit = Column(Float, default=0.0)
+    # Integer cents.
+    deposit = Column(Integer, default=0)
     roles = relationship("DbRole", back_populates="user", cascade="all, delete-orphan")
+    # Bitmask of the Role rows names, kept in sync on write so authorization never needs to join the Role table.
+    roles_mask = Column(Integer, nullable=False, default=0, server_default="0")
     is_admin = Column(Boolean, default=False)
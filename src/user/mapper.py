@@ -1,7 +1,7 @@
 from typing import Dict, Type, Optional
 
 from src.base.mapper import Mapper
-from src.user.user import User
+from src.user.user import User, roles_to_mask
 from src.user.db_user import DbUser
 
 
@@ -10,4 +10,6 @@ class UserMapper(Mapper):
         return super().data_to_domain(data=data, domain_class=domain_class, manual_mapper=manual_mapper)
 
     def domain_to_data(self, domain_data: User, model_class: Type[DbUser]) -> DbUser:
+        if isinstance(domain_data, User) and domain_data.is_loaded("roles"):
+            domain_data.roles_mask = roles_to_mask(it.name for it in domain_data.roles)
         return super().domain_to_data(domain_data=domain_data, model_class=model_class)
@@ -0,0 +1,164 @@
+import base64
+import hashlib
+import hmac
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, List, Optional
+
+
+class PasswordHasher:
+    algorithm: str = None
+
+    def encode(self, password: str) -> str:
+        raise NotImplementedError
+
+    def verify(self, password: str, encoded: str) -> bool:
+        raise NotImplementedError
+
+    def needs_rehash(self, encoded: str) -> bool:
+        # Hashes made by another algorithm or with other cost parameters should be upgraded to the current ones.
+        return self.encode_prefix() != encoded.rsplit("$", 2)[0]
+
+    def encode_prefix(self) -> str:
+        raise NotImplementedError
+
+
+class Sha256PasswordHasher(PasswordHasher):
+    # Legacy unsalted hashes, stored as a plain hex digest without any prefix.
+    algorithm = "sha256"
+
+    def encode(self, password: str) -> str:
+        return hashlib.sha256(password.encode('utf-8')).hexdigest()
+
+    def verify(self, password: str, encoded: str) -> bool:
+        return hmac.compare_digest(self.encode(password), encoded)
+
+    def needs_rehash(self, encoded: str) -> bool:
+        return "$" in encoded
+
+    def encode_prefix(self) -> str:
+        return ""
+
+
+class Pbkdf2PasswordHasher(PasswordHasher):
+    # Stored as pbkdf2_sha256$<iterations>$<salt>$<hash>
+    algorithm = "pbkdf2_sha256"
+
+    def __init__(self, iterations: int = 260000):
+        self.iterations = iterations
+
+    def encode(self, password: str, salt: Optional[str] = None, iterations: Optional[int] = None) -> str:
+        salt = salt or _new_salt()
+        iterations = iterations or self.iterations
+        _hash = hashlib.pbkdf2_hmac("sha256", password.encode('utf-8'), salt.encode('ascii'), iterations)
+        return "{0}${1}${2}${3}".format(self.algorithm, iterations, salt, _b64(_hash))
+
+    def verify(self, password: str, encoded: str) -> bool:
+        algorithm, iterations, salt, _ = encoded.split("$", 3)
+        return hmac.compare_digest(self.encode(password, salt=salt, iterations=int(iterations)), encoded)
+
+    def encode_prefix(self) -> str:
+        return "{0}${1}".format(self.algorithm, self.iterations)
+
+
+class ScryptPasswordHasher(PasswordHasher):
+    # Stored as scrypt$<n>$<r>$<p>$<salt>$<hash>
+    algorithm = "scrypt"
+
+    def __init__(self, n: int = 2 ** 14, r: int = 8, p: int = 1):
+        self.n = n
+        self.r = r
+        self.p = p
+
+    def encode(self, password: str, salt: Optional[str] = None, n: Optional[int] = None, r: Optional[int] = None,
+               p: Optional[int] = None) -> str:
+        salt = salt or _new_salt()
+        n, r, p = n or self.n, r or self.r, p or self.p
+        _hash = hashlib.scrypt(password.encode('utf-8'), salt=salt.encode('ascii'), n=n, r=r, p=p,
+                               maxmem=256 * n * r + 2 ** 20)
+        return "{0}${1}${2}${3}${4}${5}".format(self.algorithm, n, r, p, salt, _b64(_hash))
+
+    def verify(self, password: str, encoded: str) -> bool:
+        algorithm, n, r, p, salt, _ = encoded.split("$", 5)
+        return hmac.compare_digest(self.encode(password, salt=salt, n=int(n), r=int(r), p=int(p)), encoded)
+
+    def encode_prefix(self) -> str:
+        return "{0}${1}${2}${3}".format(self.algorithm, self.n, self.r, self.p)
+
+
+def get_password_hasher(algorithm: str, cost: Optional[int] = None) -> PasswordHasher:
+    # cost is the iterations count for pbkdf2_sha256 & log2(n) for scrypt.
+    if algorithm == Pbkdf2PasswordHasher.algorithm:
+        return Pbkdf2PasswordHasher(iterations=cost) if cost else Pbkdf2PasswordHasher()
+    if algorithm == ScryptPasswordHasher.algorithm:
+        return ScryptPasswordHasher(n=2 ** cost) if cost else ScryptPasswordHasher()
+    if algorithm == Sha256PasswordHasher.algorithm:
+        return Sha256PasswordHasher()
+
+    raise ValueError("Unknown password hasher {0}".format(algorithm))
+
+
+class PasswordHashing:
+    # Hashes with the configured hasher on a bounded worker pool, so a burst of sign ins can't occupy every serving
+    # thread with key stretching. hashlib releases the GIL while hashing, so worker threads are enough.
+    def __init__(self, hasher: PasswordHasher, max_workers: int = 4):
+        self.hasher = hasher
+        self.max_workers = max_workers
+
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._legacy_hasher = Sha256PasswordHasher()
+
+    def configure(self, hasher: Optional[PasswordHasher] = None, max_workers: Optional[int] = None) -> None:
+        with self._lock:
+            if hasher is not None:
+                self.hasher = hasher
+            if max_workers is not None and max_workers != self.max_workers:
+                self.max_workers = max_workers
+                if self._executor:
+                    self._executor.shutdown(wait=False)
+                    self._executor = None
+
+    def hash(self, password: str) -> str:
+        return self._get_executor().submit(self.hasher.encode, password).result()
+
+    def hash_many(self, passwords: Iterable[str]) -> List[str]:
+        return list(self._get_executor().map(self.hasher.encode, passwords))
+
+    def verify(self, password: str, encoded: Optional[str]) -> bool:
+        if not encoded:
+            return False
+
+        hasher = self._identify(encoded)
+        return self._get_executor().submit(hasher.verify, password, encoded).result()
+
+    def needs_rehash(self, encoded: str) -> bool:
+        return self.hasher.needs_rehash(encoded)
+
+    def _identify(self, encoded: str) -> PasswordHasher:
+        if "$" not in encoded:
+            return self._legacy_hasher
+
+        algorithm = encoded.split("$", 1)[0]
+        if algorithm == self.hasher.algorithm:
+            return self.hasher
+        return get_password_hasher(algorithm)
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                    thread_name_prefix="password-hashing")
+            return self._executor
+
+
+def _new_salt() -> str:
+    return base64.b64encode(os.urandom(16)).decode('ascii').rstrip("=")
+
+
+def _b64(value: bytes) -> str:
+    return base64.b64encode(value).decode('ascii').rstrip("=")
+
+
+password_hashing = PasswordHashing(hasher=Pbkdf2PasswordHasher())
@@ -2,9 +2,12 @@ import uuid
 from unittest import TestCase
 
 from sqlalchemy import create_engine
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, noload, joinedload
 
 from src.base.mapper import TwoWayDict
+from src.base.statement_recorder import record_statements
+from src.user.password_hasher import Pbkdf2PasswordHasher, ScryptPasswordHasher, Sha256PasswordHasher, \
+    PasswordHashing
 from src.user.db_role import DbRole
 from src.user.mapper import UserMapper
 from src.user.user_repository import UserRepository
@@ -23,6 +26,32 @@ class TestUserDomain(TestCase):
         self.assertEqual(user.id, _id)
         self.assertEqual(user.name, user_name)
 
+    def test_slotted_user(self):
+        user = User(name="Test User 1", roles=[Role(name="Buyer")])
+
+        self.assertFalse(hasattr(user, "__dict__"))
+        with self.assertRaises(AttributeError):
+            user.password = "password"
+
+        self.assertEqual(User.get_list_of_map(), {"roles": Role})
+        self.assertEqual(Role.get_list_of_map(), {})
+
+    def test_change_tracking_is_allocated_on_first_use(self):
+        user = User(name="Test User 1", roles=[Role(name="Buyer")])
+        self.assertIsNone(user._unloaded_children)
+        self.assertIsNone(user._loaded_children)
+        self.assertEqual(User._value_fields, tuple(it for it in User.to_dict(user) if it != "roles"))
+
+        user.mark_clean()
+        self.assertIsNone(user.roles[0]._loaded_children)
+        self.assertEqual(user.get_added_children("roles"), [])
+
+        user.mark_unloaded("roles")
+        user.mark_clean()
+        self.assertFalse(user.is_loaded("roles"))
+        self.assertIsNone(user._loaded_children)
+        self.assertEqual(user.get_removed_children("roles"), [])
+
 
 class TestDbUser(TestCase):
     def test_new_user(self):
@@ -108,6 +137,20 @@ class TestUserMapper(TestCase):
             self.assertEqual(it1.name, it2.name)
             self.assertEqual(it1.user_id, it2.user_id)
 
+    def test_plans_are_compiled_once(self):
+        mapper = UserMapper(self.mapped_entities)
+
+        for it in range(3):
+            domain_user = User(id=str(it), name="Test User {0}".format(it), roles=[Role(name="Buyer")])
+            db_user = mapper.domain_to_data(domain_user, DbUser)
+            mapper.data_to_domain(db_user.to_dict(), User)
+
+        self.assertEqual(set(mapper._data_plans), {(User, DbUser), (Role, DbRole)})
+        self.assertEqual(set(mapper._domain_plans), {User, Role})
+
+        domain_user = mapper.data_to_domain({"id": "1", "name": "Test User 1"}, User)
+        self.assertFalse(domain_user.is_loaded("roles"))
+
 
 class TestUserRepository(TestCase):
     def setUp(self):
@@ -169,6 +212,99 @@ class TestUserRepository(TestCase):
 
         self.assertEqual(res.id, _id1)
 
+    def test_get_all_loader_strategies(self):
+        self.user_repository.insert_many([User(name="Test User {0}".format(it), roles=[Role(name="Buyer")])
+                                          for it in range(5)])
+
+        with record_statements(self.engine) as statements:
+            # Roles are selectinload-ed by default, a query for the users & one for all their roles.
+            res = self.user_repository.get_all()
+            self.assertEqual(len(statements), 2)
+            self.assertTrue(all(it.roles[0].name == "Buyer" for it in res))
+
+            statements.clear()
+            res = self.user_repository.get_all(load={"roles": joinedload})
+            self.assertEqual(len(statements), 1)
+            self.assertEqual(len(res), 5)
+            self.assertTrue(all(len(it.roles) == 1 for it in res))
+
+            statements.clear()
+            res = list(self.user_repository.iter_all(batch_size=2, load={"roles": noload}))
+            self.assertEqual(len(statements), 1)
+            self.assertTrue(all(not it.is_loaded("roles") for it in res))
+
+    def test_cached_statements_follow_loader_strategies(self):
+        user = self.user_repository.insert(User(name="Test User 1", roles=[Role(name="Buyer")]))
+        self.assertTrue(self.user_repository.get_by_id(user.id).is_loaded("roles"))
+
+        user_repository = UserRepository(engine=self.engine, mapper=self.user_repository.mapper)
+        user_repository.loader_strategies = {"roles": noload}
+        self.assertFalse(user_repository.get_by_id(user.id).is_loaded("roles"))
+        self.assertFalse(user_repository.get_by_user_name(user.name).is_loaded("roles"))
+
+    def test_roles_mask_follows_roles(self):
+        domain_user = User(name="Test User 1", roles=[Role(name="Seller"), Role(name="Buyer")])
+        domain_user = self.user_repository.insert(domain_model=domain_user)
+        self.assertEqual(domain_user.roles_mask, ROLE_BITS["Seller"] | ROLE_BITS["Buyer"])
+
+        domain_user.roles.pop(0)
+        self.user_repository.insert(domain_model=domain_user)
+
+        session_user = self.user_repository.get_session_user(_id=domain_user.id)
+        self.assertEqual(session_user.roles_mask, ROLE_BITS["Buyer"])
+        self.assertTrue(session_user.has_role("Buyer"))
+        self.assertFalse(session_user.has_role("Seller"))
+
+    def test_sync_roles_mask(self):
+        _id = str(uuid.uuid4())
+        with Session(self.engine) as session:
+            session.add(DbUser(id=_id, name="Test User 1", roles=[DbRole(id=str(uuid.uuid4()), name="Seller")]))
+            session.commit()
+
+        self.user_repository.sync_roles_mask()
+
+        self.assertTrue(self.user_repository.get_session_user(_id=_id).has_role("Seller"))
+
+    def test_create_user_with_password(self):
+        user = User(name="Test User 1", roles=[Role(name="Buyer")])
+
+        res = self.user_repository.create_user(user, password="12345678")
+
+        self.assertTrue(res.id)
+        self.assertTrue(self.user_repository.validate_user_password(user_id=res.id, password="12345678"))
+        self.assertEqual([it.name for it in self.user_repository.get_by_id(res.id).roles], ["Buyer"])
+
+    def test_create_user_with_duplicated_name(self):
+        self.user_repository.create_user(User(name="Test User 1"), password="12345678")
+
+        res = self.user_repository.create_user(User(name="Test User 1"), password="12345678")
+
+        self.assertIsNone(res)
+        self.assertEqual(len(self.user_repository.get_all()), 1)
+
+    def test_import_users(self):
+        self.user_repository.create_user(User(name="Test User 1"), password="12345678")
+        users = [
+            (User(name="Test User 1"), "1111"),
+            (User(name="Test User 2", deposit=10, roles=[Role(name="Seller")]), "2222"),
+            (User(name="Test User 3"), "3333"),
+            (User(name="Test User 2"), "4444"),
+            (User(name="Test User 4", roles=[Role(name="Buyer"), Role(name="Seller")]), "5555"),
+        ]
+
+        imported_ids, skipped_names = self.user_repository.import_users(iter(users), batch_size=2)
+
+        self.assertEqual(len(imported_ids), 3)
+        self.assertEqual(skipped_names, ["Test User 1", "Test User 2"])
+
+        user_2 = self.user_repository.get_by_user_name("Test User 2")
+        self.assertEqual(user_2.deposit, 10)
+        self.assertEqual([it.name for it in user_2.roles], ["Seller"])
+        self.assertTrue(self.user_repository.validate_user_password(user_id=user_2.id, password="2222"))
+
+        user_4 = self.user_repository.get_by_user_name("Test User 4")
+        self.assertEqual(sorted(it.name for it in user_4.roles), ["Buyer", "Seller"])
+
     def test_create_new_user_with_roles(self):
         user_name = "Test User 1"
         roles = [Role(name="Seller")]
@@ -247,3 +383,46 @@ class TestUserRepository(TestCase):
         self.assertEqual(res_roles[0].user_id, res.id)
         self.assertTrue(res_roles[0].id)
 
+
+class TestPasswordHashing(TestCase):
+    def setUp(self):
+        self.hasher = Pbkdf2PasswordHasher(iterations=1000)
+        self.password_hashing = PasswordHashing(hasher=self.hasher, max_workers=2)
+
+    def test_pbkdf2_hash(self):
+        hashed_password = self.password_hashing.hash("12345678")
+
+        self.assertTrue(hashed_password.startswith("pbkdf2_sha256$1000$"))
+        self.assertNotEqual(hashed_password, self.password_hashing.hash("12345678"))
+        self.assertTrue(self.password_hashing.verify("12345678", hashed_password))
+        self.assertFalse(self.password_hashing.verify("87654321", hashed_password))
+        self.assertFalse(self.password_hashing.needs_rehash(hashed_password))
+
+    def test_scrypt_hash(self):
+        hashed_password = ScryptPasswordHasher(n=2 ** 4).encode("12345678")
+
+        self.assertTrue(hashed_password.startswith("scrypt$16$8$1$"))
+        self.assertTrue(self.password_hashing.verify("12345678", hashed_password))
+        self.assertFalse(self.password_hashing.verify("87654321", hashed_password))
+        self.assertTrue(self.password_hashing.needs_rehash(hashed_password))
+
+    def test_legacy_sha256_hash(self):
+        hashed_password = Sha256PasswordHasher().encode("12345678")
+
+        self.assertTrue(self.password_hashing.verify("12345678", hashed_password))
+        self.assertFalse(self.password_hashing.verify("87654321", hashed_password))
+        self.assertTrue(self.password_hashing.needs_rehash(hashed_password))
+
+    def test_cost_change_needs_rehash(self):
+        hashed_password = Pbkdf2PasswordHasher(iterations=500).encode("12345678")
+
+        self.assertTrue(self.password_hashing.verify("12345678", hashed_password))
+        self.assertTrue(self.password_hashing.needs_rehash(hashed_password))
+
+    def test_hash_many(self):
+        passwords = ["password {0}".format(it) for it in range(10)]
+
+        hashed_passwords = self.password_hashing.hash_many(passwords)
+
+        for password, hashed_password in zip(passwords, hashed_passwords):
+            self.assertTrue(self.password_hashing.verify(password, hashed_password))
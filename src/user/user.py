@@ -1,32 +1,68 @@
-from dataclasses import dataclass, field
-from hashlib import sha256
-from typing import List
+from dataclasses import field
+from typing import List, Optional, Iterable
 
-from src.base.domain import Domain
+from src.base.domain import Domain, domain_dataclass
+from src.base.money import Cents
+from src.user.password_hasher import password_hashing
 
 
-@dataclass
+# Every role owns a bit in User.roles_mask, new roles must take the next free bit.
+ROLE_BITS = {
+    "Buyer": 1 << 0,
+    "Seller": 1 << 1,
+}
+
+
+def roles_to_mask(role_names: Iterable[str]) -> int:
+    mask = 0
+    for it in role_names:
+        mask |= ROLE_BITS.get(it, 0)
+    return mask
+
+
+@domain_dataclass
 class Role(Domain):
     name: str = field(default=None)
     user_id: str = field(default=None)
 
 
-@dataclass
+@domain_dataclass
 class User(Domain):
     name: str = field(default=None)
-    deposit: float = field(default=0.0)
+    deposit: Cents = field(default=0)
     is_admin: bool = field(default=False)
+    roles_mask: int = field(default=0)
     roles: List[Role] = Domain.list_of_field(key="roles", list_of_type=Role)
 
     def __post_init__(self):
         super(User, self).__post_init__()
         self.roles = self.roles or []
+        if self.roles:
+            self.roles_mask = roles_to_mask(it.name for it in self.roles)
 
     def add_role(self, role: str):
+        if not self.is_loaded("roles"):
+            raise Exception("Can't add role {0}, user {1} roles aren't loaded".format(role, self.id))
+
         role_added_before = any(it.name for it in self.roles if it.name == role)
         if not role_added_before:
             self.roles.append(Role(name=role, user_id=self.id))
+            self.roles_mask |= ROLE_BITS.get(role, 0)
+
+    def has_role(self, role: str) -> bool:
+        return self.has_roles_mask(ROLE_BITS.get(role, 0))
+
+    def has_roles_mask(self, mask: int) -> bool:
+        return bool(mask) and self.roles_mask & mask == mask
+
+
+def hash_password(password: str) -> str:
+    return password_hashing.hash(password)
+
+
+def verify_password(password: str, hashed_password: Optional[str]) -> bool:
+    return password_hashing.verify(password, hashed_password)
 
 
-def hash_password(password: str):
-    return sha256(password.encode('utf-8')).hexdigest()
+def password_needs_rehash(hashed_password: str) -> bool:
+    return password_hashing.needs_rehash(hashed_password)
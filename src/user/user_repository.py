@@ -1,15 +1,22 @@
-from typing import Optional
+from typing import Optional, Tuple, Iterable, List, Dict, Callable
 
-from sqlalchemy import select
-from sqlalchemy.exc import NoResultFound
-from sqlalchemy.orm import Session
+from sqlalchemy import select, insert, update, bindparam
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, noload, selectinload
 
-from src.base.repository import Repository
+from src.base.cache import LruTtlCache
+from src.base.money import Cents
+from src.base.repository import Repository, chunked
 from src.user.db_role import DbRole
 from src.user.mapper import UserMapper
-from src.user.user import User, hash_password, Role
+from src.user.password_hasher import password_hashing
+from src.user.user import User, hash_password, Role, verify_password, password_needs_rehash, roles_to_mask
 from src.user.db_user import DbUser
 
+# Process wide cache of verified session tokens to the resolved session user, entries are tagged by the user id so any
+# write to the user through the repository drops every token cached for it.
+session_user_cache = LruTtlCache(max_size=1024, ttl=300.0)
+
 
 def get_user_repository(engine):
     mapped_entities = [
@@ -21,38 +28,188 @@ def get_user_repository(engine):
 
 
 class UserRepository(Repository):
+    loader_strategies = {
+        "roles": selectinload
+    }
+
     def __init__(self, engine, mapper: UserMapper):
         db_model_type: DbUser = DbUser
         domain_model_type: User = User
         super(UserRepository, self).__init__(engine=engine, mapper=mapper, db_model_type=db_model_type,
                                              domain_model_type=domain_model_type)
 
-    def get_by_user_name(self, user_name: str) -> Optional[User]:
+    def insert(self, domain_model: User, refresh: bool = True) -> User:
+        res = super(UserRepository, self).insert(domain_model, refresh=refresh)
+        self._invalidate_session_users([domain_model.id])
+        return res
+
+    def upsert_many(self, domain_models: Iterable[User], batch_size: int = 500) -> List[str]:
+        ids = super(UserRepository, self).upsert_many(domain_models, batch_size=batch_size)
+        self._invalidate_session_users(ids)
+        return ids
+
+    def create_user(self, user: User, password: str) -> Optional[User]:
+        # Single transaction, duplicated user names are rejected by the unique constraint on User.name. It always runs
+        # in a transaction of its own, outside any unit of work, as the rejection rolls it back.
+        self._set_uuid_if_missing(user)
+        hashed_password = hash_password(password=password)
+
         with Session(self.engine) as session:
-            stmt = select(self.db_model_type).where(self.db_model_type.name == user_name)
+            db_user: DbUser = self.mapper.domain_to_data(user, self.db_model_type)
+            db_user.password = hashed_password
+            session.add(db_user)
             try:
-                db_user = session.scalars(stmt).one()
-                return self.mapper.data_to_domain(db_user.to_dict(), self.domain_model_type)
-            except NoResultFound as e:
+                session.commit()
+            except IntegrityError as e:
+                session.rollback()
+                return None
+
+        return user
+
+    def import_users(self, users: Iterable[Tuple[User, str]], batch_size: int = 500) -> Tuple[List[str], List[str]]:
+        # Streams (user, password) pairs into batched multi row inserts, a transaction per batch.
+        # Returns the imported user ids & the skipped duplicated user names.
+        imported_ids, skipped_names = [], []
+
+        for batch in chunked(users, batch_size):
+            with Session(self.engine) as session:
+                names = [user.name for user, _ in batch]
+                stmt = select(self.db_model_type.name).where(self.db_model_type.name.in_(names))
+                existing_names = set(session.scalars(stmt).all())
+
+                new_users = []
+                for user, password in batch:
+                    if user.name in existing_names:
+                        skipped_names.append(user.name)
+                        continue
+                    existing_names.add(user.name)
+                    new_users.append((user, password))
+
+                if not new_users:
+                    continue
+
+                hashed_passwords = password_hashing.hash_many(password for _, password in new_users)
+
+                user_rows, role_rows = [], []
+                for (user, _), hashed_password in zip(new_users, hashed_passwords):
+                    self._set_uuid_if_missing(user)
+                    user_rows.append({"id": user.id, "name": user.name, "password": hashed_password,
+                                      "deposit": user.deposit, "is_admin": user.is_admin,
+                                      "roles_mask": roles_to_mask(it.name for it in user.roles)})
+                    for role in user.roles:
+                        role.user_id = user.id
+                        role_rows.append({"id": role.id, "name": role.name, "user_id": user.id})
+
+                session.execute(insert(DbUser.__table__), user_rows)
+                if role_rows:
+                    session.execute(insert(DbRole.__table__), role_rows)
+                session.commit()
+
+                imported_ids.extend(row["id"] for row in user_rows)
+
+        return imported_ids, skipped_names
+
+    def get_session_user(self, _id: str) -> Optional[User]:
+        # Loads the user without its Role rows, role checks use User.roles_mask. The roles are marked as not loaded,
+        # so writing the user back leaves them untouched.
+        return self.get_by_id(_id, load={"roles": noload})
+
+    def add_deposit(self, user_id: str, amount: Cents) -> Optional[Cents]:
+        # Adds amount to the user deposit in a single conditional UPDATE, a negative amount charges it, so concurrent
+        # deposits & purchases can't overwrite each other. Returns the new deposit, None when the user is missing or
+        # the deposit can't cover the charge.
+        table = self.db_model_type.__table__
+        stmt = self._cached_statement("add_deposit", lambda: update(table).where(
+            table.c.id == bindparam("user_id"), table.c.deposit + bindparam("amount") >= 0).values(
+            deposit=table.c.deposit + bindparam("amount")))
+        deposit_stmt = self._cached_statement(
+            "get_deposit", lambda: select(table.c.deposit).where(table.c.id == bindparam("user_id")))
+
+        with self._session() as session:
+            res = session.execute(stmt, {"user_id": user_id, "amount": amount})
+            if res.rowcount == 0:
+                return None
+
+            deposit = session.execute(deposit_stmt, {"user_id": user_id}).scalar_one()
+            self._commit(session)
+
+        self._invalidate_session_users([user_id])
+        return deposit
+
+    def sync_roles_mask(self) -> None:
+        # Rebuilds User.roles_mask from the Role rows, used when migrating databases created before the column.
+        with self._session() as session:
+            masks = {}
+            for user_id, role_name in session.execute(select(DbRole.user_id, DbRole.name)):
+                masks[user_id] = masks.get(user_id, 0) | roles_to_mask([role_name])
+
+            session.execute(update(DbUser).values(roles_mask=0))
+            for user_id, mask in masks.items():
+                session.execute(update(DbUser).where(DbUser.id == user_id).values(roles_mask=mask))
+            self._commit(session)
+
+    def get_by_user_name(self, user_name: str, load: Optional[Dict[str, Callable]] = None) -> Optional[User]:
+        if load is None:
+            stmt, skip_relations, row_plan = self._cached_statement("get_by_user_name",
+                                                                  lambda: self._select_where_name())
+        else:
+            stmt, skip_relations, row_plan = self._select_where_name(load=load)
+
+        with self._session() as session:
+            res = self._read(session, stmt, params={"name": user_name}, skip_relations=skip_relations,
+                             row_plan=row_plan)
+            return res[0] if res else None
+
+    def _select_where_name(self, load: Optional[Dict[str, Callable]] = None):
+        stmt, skip_relations, row_plan = self._select_for_read(load=load)
+        return stmt.where(self.db_model_type.name == bindparam("name")), skip_relations, row_plan
+
+    def get_credentials_by_user_name(self, user_name: str) -> Optional[Tuple[str, str]]:
+        # Only (id, password) are selected, answered from the covering index without loading the user.
+        stmt = self._cached_statement("get_credentials_by_user_name", lambda: select(
+            self.db_model_type.id, self.db_model_type.password).where(self.db_model_type.name == bindparam("name")))
+        with self._session() as session:
+            row = session.execute(stmt, {"name": user_name}).one_or_none()
+            if not row:
                 return None
 
+            return row.id, row.password
+
     def set_user_password(self, user_id: str, password: str) -> bool:
-        with Session(self.engine) as session:
+        with self._session() as session:
             try:
                 db_user: DbUser = self._get_by_id(session=session, _id=user_id)
                 hashed_password = hash_password(password=password)
                 db_user.password = hashed_password
                 session.add(db_user)
-                session.commit()
+                self._commit(session)
+                self._invalidate_session_users([user_id])
                 return True
             except Exception as e:
                 return False
 
+    def _invalidate_session_users(self, user_ids: List[str]) -> None:
+        # Cached session users are dropped once the write is committed, dropping them before would let a concurrent
+        # request cache the row as it was before the write again.
+        def invalidate():
+            for it in user_ids:
+                session_user_cache.invalidate_tag(it)
+
+        self._after_commit(invalidate)
+
     def validate_user_password(self, user_id: str, password: str) -> bool:
         try:
-            with Session(self.engine) as session:
+            with self._session() as session:
                 db_user: DbUser = self._get_by_id(session=session, _id=user_id)
-                return db_user.password == hash_password(password=password)
+                if not verify_password(password=password, hashed_password=db_user.password):
+                    return False
+
+                if password_needs_rehash(db_user.password):
+                    # Upgrade legacy & outdated hashes while the plain password is known.
+                    db_user.password = hash_password(password=password)
+                    self._commit(session)
+
+                return True
         except Exception as e:
             return False
 
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, TEXT, ForeignKey, Float
+from sqlalchemy import Column, TEXT, ForeignKey, Integer
 from sqlalchemy.orm import relationship
 
 from src import Base
@@ -11,7 +11,8 @@ class DbVendingMachineInventory(DbModel, Base):
     vending_machine_id = Column(TEXT, ForeignKey("VendingMachine.id"), nullable=False)
     product_id = Column(TEXT, ForeignKey("Product.id"), nullable=False)
     seller_id = Column(TEXT, ForeignKey("User.id"), nullable=False)
-    amount_available = Column(Float, nullable=False, default=0.0)
-    cost = Column(Float, nullable=False, default=0.0)
+    amount_available = Column(Integer, nullable=False, default=0)
+    # Integer cents.
+    cost = Column(Integer, nullable=False, default=0)
 
     vending_machine = relationship("DbVendingMachine", back_populates="inventory")
@@ -1,8 +1,10 @@
 from unittest import TestCase
 
 from sqlalchemy import create_engine
+from sqlalchemy.orm import noload
 
 from src import Base
+from src.base.statement_recorder import record_statements
 from src.product.db_product import DbProduct
 from src.product.mapper import ProductMapper
 from src.product.product import Product
@@ -19,6 +21,49 @@ from src.vending_machine.vending_machine import VendingMachine, VendingMachineIn
 from src.vending_machine.vending_machine_repository import VendingMachineRepository
 
 
+class TestVendingMachineDomain(TestCase):
+    def test_inventory_index(self):
+        vending_machine = VendingMachine(name="Vending Machine 1", model_number="FAKE MODEL 1", location="Cairo",
+                                         inventory=[
+                                             VendingMachineInventory(product_id="product-{0}".format(it),
+                                                                     seller_id="seller-1", amount_available=10, cost=2)
+                                             for it in range(100)
+                                         ])
+
+        vending_machine.sell_item(product_id="product-42", qty=3)
+        self.assertEqual(vending_machine.inventory[42].amount_available, 7)
+
+        vending_machine.create_inventory_line(
+            VendingMachineInventory(product_id="product-100", seller_id="seller-1", amount_available=1, cost=2))
+        vending_machine.update_inventory_item_qty(product_id="product-100", qty=4)
+        self.assertEqual(vending_machine.inventory[100].amount_available, 5)
+
+        # Lines added or replaced outside the aggregate are picked up too.
+        vending_machine.inventory.append(
+            VendingMachineInventory(product_id="product-101", seller_id="seller-1", amount_available=1, cost=2))
+        self.assertIs(vending_machine.get_product_inventory_line("product-101"), vending_machine.inventory[101])
+
+        vending_machine.inventory = vending_machine.inventory[:10]
+        self.assertIsNone(vending_machine.get_product_inventory_line("product-42"))
+
+        vending_machine.inventory[0].product_id = "product-200"
+        self.assertIsNone(vending_machine.get_product_inventory_line("product-0"))
+        self.assertIs(vending_machine.get_product_inventory_line("product-200"), vending_machine.inventory[0])
+
+        # Same length edits, a line replaced in place then a line removed & another one appended.
+        vending_machine.inventory[1] = VendingMachineInventory(product_id="product-300", seller_id="seller-1",
+                                                               amount_available=1, cost=2)
+        self.assertIs(vending_machine.get_product_inventory_line("product-300"), vending_machine.inventory[1])
+        self.assertIsNone(vending_machine.get_product_inventory_line("product-1"))
+
+        removed = vending_machine.inventory.pop(0)
+        vending_machine.inventory.append(
+            VendingMachineInventory(product_id="product-400", seller_id="seller-1", amount_available=5, cost=2))
+        self.assertIsNone(vending_machine.get_product_inventory_line(removed.product_id))
+        vending_machine.sell_item(product_id="product-400", qty=2)
+        self.assertEqual(vending_machine.inventory[-1].amount_available, 3)
+
+
 class TestVendingMachineRepository(TestCase):
     def setUp(self):
         db_url = "sqlite+pysqlite:///:memory:"
@@ -131,3 +176,177 @@ class TestVendingMachineRepository(TestCase):
         self.assertEqual(res_product_1.amount_available, 12)
         self.assertEqual(res_product_2.amount_available, 17)
         self.assertEqual(res_product_3.amount_available, 40)
+
+    def test_upsert_without_refresh(self):
+        product_1 = self.product_repository.insert(Product(name="Product 1", country_of_origin="Egypt", calories=90,
+                                                           flavor="Flavor 1"))
+        product_2 = self.product_repository.insert(Product(name="Product 2", country_of_origin="USA", calories=400,
+                                                           flavor="Flavor 2"))
+        user_1 = self.user_repository.insert(User(name="Test User 1", roles=[Role(name="Seller")]))
+
+        inventory = [
+            VendingMachineInventory(product_id=product_1.id, seller_id=user_1.id, amount_available=10, cost=2),
+            VendingMachineInventory(product_id=product_2.id, seller_id=user_1.id, amount_available=20, cost=3)
+        ]
+        vending_machine = VendingMachine(name="Vending Machine 1", model_number="FAKE MODEL 1", location="Cairo",
+                                         inventory=inventory)
+        self.vending_machine_repository.insert(vending_machine, refresh=False)
+
+        vending_machine.location = "Giza"
+        vending_machine.sell_item(product_id=product_1.id, qty=4)
+        vending_machine.inventory.pop()
+
+        with record_statements(self.engine) as statements:
+            res = self.vending_machine_repository.insert(vending_machine, refresh=False)
+
+        self.assertIs(res, vending_machine)
+        self.assertFalse([it for it in statements if it.lstrip().upper().startswith("SELECT")])
+        self.assertTrue(all("ON CONFLICT" in it for it in statements if it.lstrip().upper().startswith("INSERT")))
+
+        res = self.vending_machine_repository.get_by_id(_id=vending_machine.id)
+        self.assertEqual(res.location, "Giza")
+        self.assertEqual(len(res.inventory), 1)
+        self.assertEqual(res.inventory[0].amount_available, 6)
+        self.assertEqual(res.inventory[0].vending_machine_id, vending_machine.id)
+
+    def test_insert_many_and_upsert_many(self):
+        product_ids = self.product_repository.insert_many(
+            [Product(name="Product {0}".format(it), country_of_origin="Egypt", calories=90, flavor="Flavor")
+             for it in range(5)], batch_size=2)
+        user_1 = self.user_repository.insert(User(name="Test User 1", roles=[Role(name="Seller")]))
+
+        vending_machines = [
+            VendingMachine(name="Vending Machine {0}".format(it), model_number="FAKE MODEL 1", location="Cairo",
+                           inventory=[VendingMachineInventory(product_id=product_id, seller_id=user_1.id,
+                                                              amount_available=10, cost=2)
+                                      for product_id in product_ids[:it + 1]])
+            for it in range(3)
+        ]
+
+        with record_statements(self.engine) as statements:
+            ids = self.vending_machine_repository.insert_many(vending_machines, batch_size=2)
+
+        self.assertEqual(ids, [it.id for it in vending_machines])
+        # A parent & a child executemany per batch.
+        self.assertEqual(len(statements), 4)
+
+        vending_machines[0].location = "Giza"
+        vending_machines[2].inventory.pop(0)
+        vending_machines[2].sell_item(product_id=product_ids[1], qty=3)
+        self.vending_machine_repository.upsert_many(vending_machines, batch_size=2)
+
+        res = {it.id: it for it in self.vending_machine_repository.get_all()}
+        self.assertEqual(len(res), 3)
+        self.assertEqual(res[ids[0]].location, "Giza")
+        self.assertEqual(len(res[ids[1]].inventory), 2)
+        self.assertEqual({it.product_id: it.amount_available for it in res[ids[2]].inventory},
+                         {product_ids[1]: 7, product_ids[2]: 10})
+
+    def test_add_stock(self):
+        vending_machine = VendingMachine(name="Vending Machine 1", model_number="FAKE MODEL 1", location="Cairo",
+                                         inventory=[VendingMachineInventory(product_id="product-1",
+                                                                            seller_id="seller-1", amount_available=10,
+                                                                            cost=2)])
+        self.vending_machine_repository.insert(vending_machine, refresh=False)
+        loaded = self.vending_machine_repository.get_by_id(vending_machine.id)
+        line_id = loaded.inventory[0].id
+
+        # A sale committed after the line was loaded is kept.
+        self.assertTrue(self.vending_machine_repository.take_stock(inventory_line_id=line_id, qty=4))
+        with record_statements(self.engine) as statements:
+            self.assertTrue(self.vending_machine_repository.add_stock(inventory_line_id=line_id, qty=5))
+        self.assertEqual(len(statements), 1)
+
+        self.assertFalse(self.vending_machine_repository.add_stock(inventory_line_id=line_id, qty=-12))
+        self.assertFalse(self.vending_machine_repository.add_stock(inventory_line_id="missing-1", qty=1))
+        self.assertEqual(self.vending_machine_repository.get_by_id(vending_machine.id).inventory[0].amount_available,
+                         11)
+
+    def test_update_writes_changed_inventory_lines_only(self):
+        inventory = [
+            VendingMachineInventory(product_id="product-{0}".format(it), seller_id="seller-1", amount_available=10,
+                                    cost=2)
+            for it in range(3)
+        ]
+        vending_machine = VendingMachine(name="Vending Machine 1", model_number="FAKE MODEL 1", location="Cairo",
+                                         inventory=inventory)
+        self.vending_machine_repository.insert(vending_machine, refresh=False)
+        vending_machine = self.vending_machine_repository.get_by_id(vending_machine.id)
+
+        vending_machine.sell_item(product_id="product-1", qty=3)
+        vending_machine.inventory = [it for it in vending_machine.inventory if it.product_id != "product-2"]
+        vending_machine.create_inventory_line(VendingMachineInventory(product_id="product-3", seller_id="seller-1",
+                                                                      amount_available=5, cost=1))
+
+        with record_statements(self.engine) as statements:
+            self.vending_machine_repository.insert(vending_machine, refresh=False)
+
+        self.assertEqual(len(statements), 3)
+        self.assertTrue(statements[0].startswith('DELETE FROM "VendingMachineInventory"'))
+        self.assertTrue(statements[1].startswith('UPDATE "VendingMachineInventory" SET amount_available=?'))
+        self.assertTrue(statements[2].startswith('INSERT INTO "VendingMachineInventory"'))
+
+        res = self.vending_machine_repository.get_by_id(vending_machine.id)
+        self.assertEqual({it.product_id: it.amount_available for it in res.inventory},
+                         {"product-0": 10, "product-1": 7, "product-3": 5})
+
+    def test_get_by_id_with_inventory(self):
+        inventory = [
+            VendingMachineInventory(product_id="product-{0}".format(it), seller_id="seller-1", amount_available=10,
+                                    cost=2)
+            for it in range(100)
+        ]
+        vending_machine = VendingMachine(name="Vending Machine 1", model_number="FAKE MODEL 1", location="Cairo",
+                                         inventory=inventory)
+        self.vending_machine_repository.insert(vending_machine, refresh=False)
+
+        with record_statements(self.engine) as statements:
+            vending_machine = self.vending_machine_repository.get_by_id_with_inventory(vending_machine.id,
+                                                                                       product_ids=["product-7"])
+            self.assertEqual(len(statements), 1)
+            self.assertEqual([it.product_id for it in vending_machine.inventory], ["product-7"])
+
+            statements.clear()
+            vending_machine.sell_item(product_id="product-7", qty=4)
+            self.vending_machine_repository.insert(vending_machine, refresh=False)
+
+        self.assertEqual(len(statements), 1)
+        self.assertTrue(statements[0].startswith('UPDATE "VendingMachineInventory"'))
+
+        res = self.vending_machine_repository.get_by_id(vending_machine.id)
+        self.assertEqual(len(res.inventory), 100)
+        self.assertEqual(res.get_product_inventory_line("product-7").amount_available, 6)
+
+    def test_rows_hydration_matches_orm_reads(self):
+        vending_machines = [
+            VendingMachine(name="Vending Machine {0}".format(it), model_number="FAKE MODEL 1", location="Cairo",
+                           inventory=[
+                               VendingMachineInventory(product_id="product-{0}".format(product), seller_id="seller-1",
+                                                       amount_available=10, cost=2)
+                               for product in range(it)
+                           ])
+            for it in range(4)
+        ]
+        self.vending_machine_repository.insert_many(vending_machines)
+
+        with record_statements(self.engine) as statements:
+            res = self.vending_machine_repository.get_all()
+
+        # The vending machines columns then all of their inventory lines, as plain rows.
+        self.assertEqual(len(statements), 2)
+        self.assertTrue(statements[0].startswith('SELECT "VendingMachine".id, "VendingMachine".name'))
+
+        self.vending_machine_repository.hydrate_rows = False
+        orm_res = self.vending_machine_repository.get_all()
+
+        by_id = {it.id: it for it in orm_res}
+        for it in res:
+            self.assertEqual(it, by_id[it.id])
+            self.assertTrue(it.is_tracked())
+            self.assertEqual(sorted(it.inventory, key=lambda line: line.id),
+                             sorted(by_id[it.id].inventory, key=lambda line: line.id))
+
+        self.vending_machine_repository.hydrate_rows = True
+        res = self.vending_machine_repository.get_by_id(vending_machines[0].id, load={"inventory": noload})
+        self.assertFalse(res.is_loaded("inventory"))
+        self.assertEqual(res.inventory, [])
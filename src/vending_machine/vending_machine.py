@@ -1,7 +1,8 @@
-from dataclasses import dataclass, field
-from typing import List, Optional
+from dataclasses import field
+from typing import List, Optional, Dict
 
-from src.base.domain import Domain
+from src.base.domain import Domain, domain_dataclass
+from src.base.money import Cents
 
 
 class VendingMachineException(Exception):
@@ -12,13 +13,13 @@ class VendingMachineMissingException(Exception):
     pass
 
 
-@dataclass
+@domain_dataclass
 class VendingMachineInventory(Domain):
     vending_machine_id: str = field(default=None)
     product_id: str = field(default=None)
     seller_id: str = field(default=None)
-    amount_available: float = field(default=0.0)
-    cost: float = field(default=0.0)
+    amount_available: int = field(default=0)
+    cost: Cents = field(default=0)
 
     def __post_init__(self):
         super(VendingMachineInventory, self).__post_init__()
@@ -30,7 +31,7 @@ class VendingMachineInventory(Domain):
                 raise VendingMachineException("{0} can't be null".format(_v))
 
 
-@dataclass
+@domain_dataclass(extra_slots=("_inventory_index",))
 class VendingMachine(Domain):
     name: str = field(default=None)
     model_number: str = field(default=None)
@@ -42,6 +43,7 @@ class VendingMachine(Domain):
         super(VendingMachine, self).__post_init__()
 
         self.inventory = self.inventory or []
+        self._index_inventory()
 
     def reset_inventory_item_qty(self, product_id: str, qty: int):
         inventory_item = self._get_inventory_line(_id=product_id)
@@ -60,6 +62,7 @@ class VendingMachine(Domain):
 
     def create_inventory_line(self, line: VendingMachineInventory) -> None:
         self.inventory.append(line)
+        self._inventory_index.setdefault(line.product_id, len(self.inventory) - 1)
 
     def get_product_inventory_line(self, product_id) -> Optional[VendingMachineInventory]:
         try:
@@ -67,7 +70,7 @@ class VendingMachine(Domain):
         except VendingMachineMissingException as e:
             return None
 
-    def update_inventory_item_cost(self, product_id: str, cost: float):
+    def update_inventory_item_cost(self, product_id: str, cost: Cents):
         inventory_item = self._get_inventory_line(_id=product_id)
         inventory_item.cost = cost
 
@@ -75,8 +78,20 @@ class VendingMachine(Domain):
         inventory_item = self._get_inventory_line(_id=product_id)
         inventory_item.amount_available += qty
 
-    def _get_inventory_line(self, _id: str) -> Optional[VendingMachineInventory]:
-        for it in self.inventory:
-            if it.product_id == _id:
-                return it
-        raise VendingMachineMissingException("product_id {0} not found".format(_id))
+    def _get_inventory_line(self, _id: str) -> VendingMachineInventory:
+        # product_id to the position of its first inventory line. Lines replaced, removed or moved outside the
+        # aggregate leave the index stale, so a hit is checked against the line at its position & a miss reindexes.
+        position = self._inventory_index.get(_id)
+        if position is None or position >= len(self.inventory) or self.inventory[position].product_id != _id:
+            position = self._index_inventory().get(_id)
+
+        if position is None:
+            raise VendingMachineMissingException("product_id {0} not found".format(_id))
+        return self.inventory[position]
+
+    def _index_inventory(self) -> Dict[str, int]:
+        self._inventory_index = {}
+        for position, it in enumerate(self.inventory):
+            self._inventory_index.setdefault(it.product_id, position)
+
+        return self._inventory_index
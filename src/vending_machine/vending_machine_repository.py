@@ -1,3 +1,8 @@
+from typing import List, Optional
+
+from sqlalchemy import bindparam, update
+from sqlalchemy.orm import selectinload, joinedload
+
 from src.base.repository import Repository
 from src.vending_machine.db_vending_machine import DbVendingMachine
 from src.vending_machine.db_vending_machine_inventory import DbVendingMachineInventory
@@ -17,8 +22,61 @@ def get_vending_machine_repository(engine):
 
 
 class VendingMachineRepository(Repository):
+    loader_strategies = {
+        "inventory": selectinload
+    }
+
     def __init__(self, engine, mapper: VendingMachineMapper):
         db_model_type = DbVendingMachine
         domain_model_type = VendingMachine
         super(VendingMachineRepository, self).__init__(engine=engine, mapper=mapper, db_model_type=db_model_type,
                                                        domain_model_type=domain_model_type)
+
+    def take_stock(self, inventory_line_id: str, qty: int) -> bool:
+        # Takes qty items off the inventory line in a single conditional UPDATE, like VendingMachine.sell_item the line
+        # must keep at least an item. Returns False when it can't.
+        table = DbVendingMachineInventory.__table__
+        stmt = self._cached_statement("take_stock", lambda: update(table).where(
+            table.c.id == bindparam("line_id"), table.c.amount_available > bindparam("qty")).values(
+            amount_available=table.c.amount_available - bindparam("qty")))
+
+        with self._session() as session:
+            res = session.execute(stmt, {"line_id": inventory_line_id, "qty": qty})
+            if res.rowcount == 0:
+                return False
+
+            self._commit(session)
+            return True
+
+    def add_stock(self, inventory_line_id: str, qty: int) -> bool:
+        # Adds qty items to the inventory line in a single conditional UPDATE, so restocking can't overwrite concurrent
+        # sales. A negative qty can't take the line below zero, returns False when it would or the line is missing.
+        table = DbVendingMachineInventory.__table__
+        stmt = self._cached_statement("add_stock", lambda: update(table).where(
+            table.c.id == bindparam("line_id"), table.c.amount_available + bindparam("qty") >= 0).values(
+            amount_available=table.c.amount_available + bindparam("qty")))
+
+        with self._session() as session:
+            res = session.execute(stmt, {"line_id": inventory_line_id, "qty": qty})
+            if res.rowcount == 0:
+                return False
+
+            self._commit(session)
+            return True
+
+    def get_by_id_with_inventory(self, _id: str, product_ids: List[str]) -> Optional[VendingMachine]:
+        # Loads the vending machine with only the inventory lines of the given products, in a single query. Writing it
+        # back only touches those lines, the other lines were never loaded so they aren't tracked as removed.
+        def load_product_lines(inventory):
+            return joinedload(inventory.and_(
+                DbVendingMachineInventory.product_id.in_(bindparam("product_ids", expanding=True))))
+
+        stmt, skip_relations = self._cached_statement(
+            "get_by_id_with_inventory", lambda: self._select_where_id(load={"inventory": load_product_lines}))
+
+        with self._session() as session:
+            db_model = session.scalars(stmt, {"id": _id, "product_ids": product_ids}).unique().one_or_none()
+            if db_model:
+                return self._to_domain(db_model, skip_relations=skip_relations)
+
+            return None